@@ -0,0 +1,24 @@
+import argparse
+import sys
+from tools.benchmark import run
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Algo Simulator Benchmark')
+
+    parser.add_argument('--seed', '-s', type=int, default=0)
+    parser.add_argument('--games', '-g', type=int, default=5)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help="seconds to repeat each benchmark")
+    parser.add_argument('--max-candidates', type=int, default=200000,
+                        help="skip enumeration of larger candidate sets")
+    parser.add_argument('--label', '-l', default=None,
+                        help="version label added to each record")
+    parser.add_argument('--output', '-o', default=None)
+
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output is None else open(args.output, "a")
+    run(output=output, seed=args.seed, games=args.games, max_candidates=args.max_candidates,
+        min_time=args.min_time, label=args.label)
+    if args.output is not None:
+        output.close()
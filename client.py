@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+from tools.events import CONSOLE_FORMATS
+from tools.server import play_client
+
+
+def format_card(card) -> str:
+    number = "??" if card["number"] is None else f"{card['number']:02}"
+    return f"{card['color']}{number}"
+
+
+def choose(request) -> dict:
+    # The same inputs as Human of main.py. The server asks again for invalid ones.
+    if request["new_card"] is not None:
+        print(f"Draw: {format_card(request['new_card'])}")
+    print(f"Your cards: {[format_card(card) for card in request['hands']]}")
+    inputs = input("Enter '[position] [card] [player id]' or blank. > ").split()
+    if len(inputs) == 0:
+        return {"skip": True}
+    if len(inputs) not in (2, 3) or len(inputs[1]) <= 1:
+        return {}
+    try:
+        command = {"position": int(inputs[0]), "color": inputs[1][0].upper(),
+                   "number": int(inputs[1][1:])}
+        if len(inputs) == 3:
+            command["attacked_to"] = int(inputs[2])
+    except ValueError:
+        return {}
+    return command
+
+
+def show(message) -> None:
+    event = message["event"]
+    if event == "match":
+        print(f"You are Player{message['player_id']}.")
+    elif event == "status":
+        print("\n".join(message["players"]))
+    elif event == "error":
+        print(message["message"])
+    elif event in CONSOLE_FORMATS:
+        print(CONSOLE_FORMATS[event](message))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Algo Simulator Client')
+
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', '-p', type=int, default=8765)
+
+    args = parser.parse_args()
+    asyncio.run(play_client(host=args.host, port=args.port, choose=choose, show=show))
@@ -1,16 +1,21 @@
 import argparse
 from tools.game import Game
 import random
-from tools.logic import Human, MaxEntropy, EpsilonGreedy
+from tools.logic import Human, MaxEntropy, AnytimeMaxEntropy, EpsilonGreedy
+from tools.pacer import SleepPacer
+from tools.consts import SLEEP_SECONDS
+from tools.opening_book import OpeningBook
 
 
-def logic_factory(index, cpu: str, human_player: int):
+def logic_factory(index, cpu: str, human_player: int, time_budget: float, opening_book=None):
     if index == human_player:
         return Human()
     if cpu == "e_greedy":
-        return EpsilonGreedy(epsilon=0)
+        return EpsilonGreedy(epsilon=0, opening_book=opening_book)
     if cpu == "max_entropy":
-        return MaxEntropy()
+        return MaxEntropy(opening_book=opening_book)
+    if cpu == "anytime_max_entropy":
+        return AnytimeMaxEntropy(time_budget=time_budget, opening_book=opening_book)
 
     raise Exception(f"Invalid cpu: {cpu}.")
 
@@ -21,7 +26,11 @@ if __name__ == '__main__':
     parser.add_argument('--human-player', '-hp', type=int, choices=[0, 1])
     parser.add_argument('--no-human', action='store_true')
     parser.add_argument('--cpu', default='e_greedy',
-                        choices=["e_greedy", "max_entropy"])
+                        choices=["e_greedy", "max_entropy", "anytime_max_entropy"])
+    parser.add_argument('--time-budget', type=float, default=1.0,
+                        help="seconds per move of anytime_max_entropy")
+    parser.add_argument('--opening-book', default=None,
+                        help="file generated by opening_book.py")
 
     args = parser.parse_args()
     if args.no_human:
@@ -31,7 +40,9 @@ if __name__ == '__main__':
     else:
         human_player = args.human_player
 
-    logics = [logic_factory(index=i, cpu=args.cpu,
-                            human_player=human_player) for i in range(2)]
-    game = Game(logics=logics)
+    opening_book = None if args.opening_book is None else OpeningBook.load(
+        args.opening_book)
+    logics = [logic_factory(index=i, cpu=args.cpu, human_player=human_player,
+                            time_budget=args.time_budget, opening_book=opening_book) for i in range(2)]
+    game = Game(logics=logics, pacer=SleepPacer(seconds=SLEEP_SECONDS))
     game.start()
@@ -0,0 +1,15 @@
+import argparse
+import time
+from tools.opening_book import OpeningBook
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Algo Simulator Opening Book')
+
+    parser.add_argument('--output', '-o', default='opening_book.npy')
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    book = OpeningBook.generate()
+    book.save(args.output)
+    print(f"{book.counts.shape} {book.counts.dtype} in {time.perf_counter() - start:.1f}s: {args.output}")
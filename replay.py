@@ -0,0 +1,43 @@
+import argparse
+import itertools
+import json
+from tools.game_log import Replay, read_game_logs
+from tools.logic import AnytimeMaxEntropy, EpsilonGreedy, MaxEntropy
+from tools.events import NullSink
+from tools.profiler import Profiler
+
+
+def logic_factory(cpu: str, time_budget: float):
+    if cpu == "e_greedy":
+        return EpsilonGreedy(epsilon=0)
+    if cpu == "max_entropy":
+        return MaxEntropy()
+    if cpu == "anytime_max_entropy":
+        return AnytimeMaxEntropy(time_budget=time_budget)
+
+    raise Exception(f"Invalid cpu: {cpu}.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Algo Simulator Replay')
+
+    parser.add_argument('log', help="file written by GameLogSink")
+    parser.add_argument('--game', '-g', type=int, default=0,
+                        help="index of the game in the file")
+    parser.add_argument('--decision', '-d', type=int, default=0,
+                        help="index of the decision in the game")
+    parser.add_argument('--cpu', default='max_entropy',
+                        choices=["e_greedy", "max_entropy", "anytime_max_entropy"])
+    parser.add_argument('--time-budget', type=float, default=1.0,
+                        help="seconds per move of anytime_max_entropy")
+
+    args = parser.parse_args()
+
+    log = next(itertools.islice(read_game_logs(args.log), args.game, None))
+    arguments = Replay(log).decision(args.decision)
+    logic = logic_factory(cpu=args.cpu, time_budget=args.time_budget)
+    logic.sink = NullSink()
+    logic.profiler = Profiler()
+    attack, meta = logic.act(**arguments)
+    print(f"Attack: {attack}")
+    print(json.dumps(meta, default=str, indent=2))
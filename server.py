@@ -0,0 +1,51 @@
+import argparse
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from tools.logic import MaxEntropy, AnytimeMaxEntropy, EpsilonGreedy
+from tools.pacer import SleepPacer
+from tools.consts import SLEEP_SECONDS
+from tools.server import GameServer
+
+
+def logic_factory(cpu: str, time_budget: float):
+    if cpu == "e_greedy":
+        return EpsilonGreedy(epsilon=0)
+    if cpu == "max_entropy":
+        return MaxEntropy()
+    if cpu == "anytime_max_entropy":
+        return AnytimeMaxEntropy(time_budget=time_budget)
+
+    raise Exception(f"Invalid cpu: {cpu}.")
+
+
+async def serve(args) -> None:
+    with ProcessPoolExecutor(max_workers=args.workers,
+                             mp_context=multiprocessing.get_context("forkserver")) as executor:
+        server = GameServer(cpu_factory=partial(logic_factory, cpu=args.cpu, time_budget=args.time_budget),
+                            executor=executor, players=args.players, seed=args.seed,
+                            pacer=SleepPacer(seconds=args.sleep))
+        await server.start(host=args.host, port=args.port)
+        print(f"Serving on {args.host}:{server.port}")
+        await server.server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Algo Simulator Server')
+
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', '-p', type=int, default=8765)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help="processes for the decisions of CPU logics")
+    parser.add_argument('--seed', '-s', type=int, default=None)
+    parser.add_argument('--sleep', type=float, default=SLEEP_SECONDS,
+                        help="seconds before judging each attack")
+    parser.add_argument('--cpu', default='e_greedy',
+                        choices=["e_greedy", "max_entropy", "anytime_max_entropy"])
+    parser.add_argument('--time-budget', type=float, default=1.0,
+                        help="seconds per move of anytime_max_entropy")
+
+    args = parser.parse_args()
+    asyncio.run(serve(args))
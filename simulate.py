@@ -1,27 +1,60 @@
 import argparse
-from tools.game import Game
+from tools.batch import BatchEpsilonGreedy, BatchGame
 from tools.logic import EpsilonGreedy
+from tools.solver_cache import SolverCache
+from tools.game_log import GameLogSink
+from tools.tournament import MatchResult, Tournament
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Algo Simulator Parser')
 
     parser.add_argument('--trials', '-t', type=int, default=10)
+    parser.add_argument('--workers', '-w', type=int, default=None)
+    parser.add_argument('--seed', '-s', type=int, default=0)
+    parser.add_argument('--batch', action='store_true',
+                        help="play the games of each matchup in lockstep in one process")
+    parser.add_argument('--solver-cache', default=None,
+                        help="sqlite file to keep counts of hand candidates across runs and workers")
+    parser.add_argument('--output', '-o', default=None,
+                        help="file to append a record of each game. a run with the same file resumes")
+    parser.add_argument('--game-log', default=None,
+                        help="file to append a JSON line of each game for replay.py")
 
     args = parser.parse_args()
+    if args.batch:
+        for flag, value in [("--solver-cache", args.solver_cache), ("--output", args.output),
+                            ("--game-log", args.game_log)]:
+            if value is not None:
+                parser.error(f"{flag} can't be used with --batch.")
 
     epsilons = [0, 0.1, 0.5, 1]
-    results = {}
 
-    for e1 in epsilons:
-        for e2 in epsilons:
-            logics = [EpsilonGreedy(epsilon=e1),
-                      EpsilonGreedy(epsilon=e2)]
-            game = Game(logics=logics, sleep_seconds=0)
-            winners = []
-            for _ in range(args.trials):
-                outputs = game.start()
-                winners.append(outputs["winner"])
+    if args.batch:
+        results = {}
+        for i, e1 in enumerate(epsilons):
+            for j, e2 in enumerate(epsilons):
+                name = f"{e1}_{e2}"
+                outputs = BatchGame(logics=[BatchEpsilonGreedy(epsilon=e1), BatchEpsilonGreedy(epsilon=e2)],
+                                    games=args.trials, seed=[args.seed, i, j]).start()
+                results[name] = MatchResult(name=name, players=2)
+                for winner, turns in zip(outputs["winner"].tolist(), outputs["turns"].tolist()):
+                    results[name].add(winner=None if winner < 0 else winner, turns=turns)
+    else:
+        solver_cache = None if args.solver_cache is None else SolverCache(
+            args.solver_cache)
+        matchups = {}
+        for e1 in epsilons:
+            for e2 in epsilons:
+                matchups[f"{e1}_{e2}"] = [EpsilonGreedy(epsilon=e1, solver_cache=solver_cache),
+                                          EpsilonGreedy(epsilon=e2, solver_cache=solver_cache)]
 
-            results[f"{e1}_{e2}"] = (len(winners)-sum(winners))/len(winners)
+        game_options = None if args.game_log is None else {
+            "sink": GameLogSink(args.game_log)}
+        tournament = Tournament(matchups=matchups, trials=args.trials,
+                                workers=args.workers, seed=args.seed, game_options=game_options,
+                                output=args.output)
+        results = tournament.run()
 
-    print(results)
+    print({name: result.win_rate() for name, result in results.items()})
+    for result in results.values():
+        print(result)
@@ -1,25 +1,30 @@
 import argparse
-from tools.game import Game
 from tools.logic import EpsilonGreedy, MaxEntropy
+from tools.tournament import Tournament
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Algo Simulator Parser')
 
     parser.add_argument('--trials', '-t', type=int, default=10)
+    parser.add_argument('--workers', '-w', type=int, default=None)
+    parser.add_argument('--seed', '-s', type=int, default=0)
+    parser.add_argument('--output', '-o', default=None,
+                        help="file to append a record of each game. a run with the same file resumes")
 
     args = parser.parse_args()
 
-    results = []
     baseline = EpsilonGreedy(epsilon=0.1)
     proposed = MaxEntropy()
 
-    logics_list = [[baseline, proposed], [proposed, baseline]]
-    for logics in logics_list:
-        game = Game(logics=logics, sleep_seconds=0)
-        winners = []
-        for _ in range(args.trials):
-            outputs = game.start()
-            winners.append(outputs["winner"])
-        results.append((len(winners)-sum(winners))/len(winners))
+    matchups = {"baseline_proposed": [baseline, proposed],
+                "proposed_baseline": [proposed, baseline]}
+    tournament = Tournament(matchups=matchups, trials=args.trials,
+                            workers=args.workers, seed=args.seed, output=args.output)
+    results = tournament.run()
 
-    print(results)
+    print([result.win_rate() for result in results.values()])
+    for result in results.values():
+        print(result)
+        print(f"mean turns: {result.mean_turns()}")
+        for calibration in result.calibration():
+            print(calibration)
@@ -1,7 +1,43 @@
 
 import unittest
+import unittest.mock
+import itertools
+import copy
+import pickle
 from tools.card_list import Hands, SimulationHands
-from tools.card import Card,  CardContent
+from tools.card import Card,  CardContent, decode, encode
+from tools.player import Player
+from tools.logic import enumerate_candidates, enumerate_candidate_matrix
+from tools.counting import count_ascending, narrow_slots, sample_ascending, batch_count_ascending, count_disjoint
+from tools.batch import BatchGame, BatchEpsilonGreedy, BatchState, calculate_batch_attacks_with_proba
+import numpy as np
+from tools.events import ListSink
+from tools.game import Game
+from tools.pacer import Pacer, SleepPacer
+from tools.logic import EpsilonGreedy, calculate_candidate_matrices, count_hand_candidates, calculate_attacks_with_proba
+from tools.logic import calculate_hand_candidates, transform_candidates_from_hand_to_attack
+from tools.belief import BeliefTracker
+from tools.history import index_history
+from tools.attack import Attack
+from tools.transposition import TranspositionTable, fingerprint
+from tools.simulation import SimulationPlayer
+from tools.logic import AnytimeMaxEntropy, MaxEntropy, maximize_entropy, estimate_self_entropy, calculate_entropy_gain
+import random
+import time
+import io
+import json
+from tools.benchmark import run as run_benchmark
+from tools.opening_book import OpeningBook
+from tools.logic import lookup_opening
+from tools.solver_cache import SolverCache, solver_config
+import os
+import tempfile
+from tools.game_log import GameLogSink, Replay, read_game_logs
+from tools.tournament import Tournament
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from tools.server import GameServer, play_client
 
 
 class HandsTest(unittest.TestCase):
@@ -63,5 +99,1005 @@ class SimulationHandsTest(unittest.TestCase):
         self.assertEqual(old, hands.cards[position].get_content())
 
 
+class CardContentTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_code(self):
+        contents = [CardContent(color, number)
+                    for number in range(12) for color in ['W', 'B']]
+        for content in contents:
+            self.assertEqual(content, CardContent.from_code(content.to_code()))
+        # codes are ordered in the same way as contents.
+        self.assertEqual(sorted(contents),
+                         [CardContent.from_code(code) for code in sorted(content.to_code() for content in contents)])
+
+    def test_value_types(self):
+        # contents are interned, and all of them are hashable and immutable
+        self.assertIs(CardContent("W", 5), CardContent.from_code(CardContent("W", 5).to_code()))
+        self.assertIs(CardContent("W", 5), pickle.loads(pickle.dumps(CardContent("W", 5))))
+        card = Card(color="B", number=3, opened=False, card_id=1)
+        attack = Attack(card_id=1, position=0, color="B", number=3, attacked_to=1, attacked_by=0)
+        self.assertEqual(1, len({card, Card(color="B", number=3, opened=False, card_id=1)}))
+        self.assertEqual(3, len({card, card.open(), card.set_owner(0)}))
+        self.assertEqual(1, len({attack, Attack(card_id=1, position=0, color="B", number=3, attacked_to=1, attacked_by=0)}))
+        for value in [card.set_owner(0), attack]:
+            self.assertEqual(value, pickle.loads(pickle.dumps(value)))
+            self.assertEqual(value, copy.deepcopy(value))
+            self.assertEqual(str(value), str(pickle.loads(pickle.dumps(value))))
+        self.assertIs(card.get_content(referred_by=None), pickle.loads(pickle.dumps(card)).get_content())
+        with self.assertRaises(AttributeError):
+            CardContent("W", 5).number = 6
+        with self.assertRaises(AttributeError):
+            card.opened = True
+        with self.assertRaises(AttributeError):
+            attack.position = 1
+        self.assertFalse(Hands(cards=[card, Card(color="B", number=3, card_id=2)]).is_unique())
+
+
+class EnumerateCandidatesTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_product(self):
+        # W04 B?? W?? W?? W09
+        card_contents = [('W', 4, True), ('B', 6, False), ('W', 6, False),
+                         ('W', 7, False), ('W', 9, True)]
+        opponent = Player(player_id=1, hands=Hands(cards=[
+            Card(color=color, number=number, opened=opened, owned_by=1, card_id=i)
+            for i, (color, number, opened) in enumerate(card_contents)]))
+        local_candidates_list = [
+            [CardContent(color, number).to_code() for number in range(5, 9)]
+            for color in ['B', 'W', 'W']]
+
+        results = enumerate_candidates(
+            local_candidates_list=local_candidates_list,
+            opponent_closed_positions={1: [1, 2, 3]}, opponents=[opponent])
+
+        expected = []
+        for contents in itertools.product(*local_candidates_list):
+            sim_hands = SimulationHands(cards=opponent.hands.cards)
+            for position, code in zip([1, 2, 3], contents):
+                sim_hands = sim_hands.overwrite(
+                    position, CardContent.from_code(code))
+            if sim_hands.is_valid():
+                expected.append(
+                    [(1, tuple(card.get_code() for card in sim_hands.cards))])
+        self.assertEqual(expected, results)
+
+        slots = [[opponent.hands.cards[0].get_code()]] + local_candidates_list + \
+            [[opponent.hands.cards[4].get_code()]]
+        matrix = enumerate_candidate_matrix(slots)
+        self.assertEqual([codes for (_, codes), in results],
+                         [tuple(row) for row in matrix.tolist()])
+
+
+class CountAscendingTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_product(self):
+        slots = [[1, 3, 5], [4], [2, 5, 6, 8], [6, 7, 9]]
+        sequences = [sequence for sequence in itertools.product(*slots)
+                     if all(a < b for a, b in zip(sequence, sequence[1:]))]
+        total, marginals = count_ascending(slots)
+
+        self.assertEqual(len(sequences), total)
+        for p, slot in enumerate(slots):
+            expected = [len([s for s in sequences if s[p] == item])
+                        for item in slot]
+            self.assertEqual(expected, marginals[p])
+
+    def test_no_sequence(self):
+        total, marginals = count_ascending([[3], [1, 2]])
+        self.assertEqual(0, total)
+        self.assertEqual([[0], [0, 0]], marginals)
+
+
+class CountDisjointTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_product(self):
+        hands = [[[1, 3, 5], [4, 6]], [[2, 3, 4], [5, 6, 7], [6, 8]], [[3, 7]]]
+        sequences = [combination for combination in itertools.product(*[itertools.product(*slots) for slots in hands])
+                     if all(all(a < b for a, b in zip(sequence, sequence[1:])) for sequence in combination)
+                     and len({item for sequence in combination for item in sequence}) == 6]
+        total, marginals = count_disjoint(hands)
+
+        self.assertEqual(len(sequences), total)
+        for h, slots in enumerate(hands):
+            for p, slot in enumerate(slots):
+                expected = [len([s for s in sequences if s[h][p] == item])
+                            for item in slot]
+                self.assertEqual(expected, marginals[h][p])
+
+    def test_single_hands(self):
+        slots = [[1, 3, 5], [4], [2, 5, 6, 8], [6, 7, 9]]
+        total, marginals = count_disjoint([slots])
+        self.assertEqual(count_ascending(slots), (total, marginals[0]))
+
+
+class NarrowSlotsTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_closed_run(self):
+        # W04 B?? W?? W?? W09
+        def codes(color, numbers):
+            return [CardContent(color, number).to_code() for number in numbers]
+        slots = [codes('W', [4]), codes('B', range(12)), codes('W', range(12)),
+                 codes('W', range(12)), codes('W', [9])]
+        narrowed = narrow_slots(slots)
+        self.assertEqual(tuple(codes('B', [5, 6, 7])), narrowed[1])
+        self.assertEqual(tuple(codes('W', [5, 6, 7])), narrowed[2])
+        self.assertEqual(tuple(codes('W', [6, 7, 8])), narrowed[3])
+
+    def test_no_sequence(self):
+        self.assertEqual([(), ()], narrow_slots([[3], [1, 2]]))
+
+
+class SampleAscendingTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_uniform(self):
+        slots = [[1, 3, 5, 7], [2, 4, 6, 8, 9], [4, 5, 10], [11]]
+        expected = enumerate_candidate_matrix(slots).tolist()
+        samples = sample_ascending(
+            slots, size=20000, rng=np.random.default_rng(0)).tolist()
+        self.assertEqual({tuple(row) for row in expected},
+                         {tuple(row) for row in samples})
+        for row in expected:
+            # 20000 / 18 samples each
+            self.assertAlmostEqual(1 / len(expected),
+                                   samples.count(row) / len(samples), delta=0.01)
+
+    def test_infeasible(self):
+        self.assertEqual((0, 2), sample_ascending([[5], [3]], size=10).shape)
+
+
+class BatchCountAscendingTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_count_ascending(self):
+        rng = np.random.default_rng(0)
+        domains = rng.random((20, 4, 12)) < 0.4
+        totals, marginals = batch_count_ascending(domains)
+        for hands, total, marginal in zip(domains, totals, marginals):
+            slots = [np.nonzero(slot)[0].tolist() for slot in hands]
+            expected_total, expected_marginals = count_ascending(slots)
+            self.assertEqual(expected_total, total)
+            for slot, counts, expected in zip(hands, marginal, expected_marginals):
+                self.assertEqual(expected, counts[slot].tolist())
+
+
+class BatchGameTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_start(self):
+        for players in [2, 3]:
+            outputs = BatchGame(logics=[BatchEpsilonGreedy(epsilon=0.5) for _ in range(players)],
+                                games=100, seed=0).start()
+            finished = outputs["winner"] >= 0
+            self.assertTrue(set(outputs["winner"][finished].tolist()) <= set(range(players)))
+            self.assertTrue((outputs["turns"][finished] > 0).all())
+            self.assertTrue((outputs["successes"] <= outputs["attacks"]).all())
+
+
+def scalar_situation(state, game, attacked_to):
+    # the players, opened cards, new card and history of a game of BatchState for Game's logics
+    players = []
+    for player_id in range(state.players):
+        codes = np.nonzero(state.owner[game] == player_id)[0].tolist()
+        players.append(Player(player_id=player_id, hands=Hands(cards=[
+            Card(*decode(code), opened=bool(state.opened[game, code]), owned_by=player_id, card_id=code)
+            for code in codes])))
+    history = [Attack(card_id=int(card), position=0, color=decode(int(code))[0], number=decode(int(code))[1],
+                      attacked_to=attacked_to, attacked_by=int(state.attacker[game]))
+               for card, code in zip(*np.nonzero(state.tried[game]))]
+    opened_cards = [CardContent.from_code(int(code)) for code in np.nonzero(
+        state.opened[game] & (state.owner[game] >= 0))[0]]
+    new_card = None if state.new_card[game] < 0 else CardContent.from_code(int(state.new_card[game]))
+    return dict(player=players[state.attacker[game]], opponents=[players[attacked_to]],
+                opened_cards=opened_cards, new_card=new_card, history=history)
+
+
+class BatchSolverTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_scalar(self):
+        # random states: some cards are opened and some wrong codes are tried
+        rng = np.random.default_rng(0)
+        games = 30
+        state = BatchState(games=games, players=2, colors=['B', 'W'], numbers=list(range(12)), rng=rng)
+        all_games = np.arange(games)
+        for player_id in range(2):
+            for _ in range(4 + player_id):
+                state.owner[all_games, state.draw(all_games)] = player_id
+        state.attacker[:] = rng.integers(0, 2, games)
+        state.new_card[:] = state.draw(all_games)
+        for game in range(games):
+            for code in np.nonzero(state.owner[game] >= 0)[0]:
+                if rng.random() < 0.3:
+                    state.opened[game, code] = True
+                elif rng.random() < 0.5:
+                    wrong = [other for other in range(code % 2, 24, 2) if other != code]
+                    state.tried[game, code, rng.choice(wrong, size=2, replace=False)] = True
+
+        attacked_to = 1 - state.attacker.astype(np.int64)
+        codes, proba = calculate_batch_attacks_with_proba(state=state, games=all_games, attacked_to=attacked_to)
+        for game in range(games):
+            _, attacks_with_proba = calculate_attacks_with_proba(
+                **scalar_situation(state, game, int(attacked_to[game])))
+            expected = np.zeros(proba.shape[1:])
+            for attack, p in attacks_with_proba:
+                expected[attack.position, attack.card_content.to_code()] = p
+            np.testing.assert_allclose(expected, proba[game])
+
+
+class GameTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_headless(self):
+        sink = ListSink()
+        # seeds of the tests in GameTest are known to finish
+        game = Game(logics=[EpsilonGreedy(), EpsilonGreedy()], sink=sink, seed=0)
+        outputs = game.start()
+        self.assertIsNotNone(outputs)
+        events = [record["event"] for record in sink.events]
+        self.assertEqual("game_over", events[-1])
+        self.assertEqual(outputs["winner"], sink.events[-1]["winner"])
+        self.assertEqual(len(outputs["attack_results"]),
+                         events.count("attack"))
+
+    def test_seed(self):
+        def play(seed):
+            logics = [EpsilonGreedy(epsilon=0.5), MaxEntropy()]
+            return Game(logics=logics, sink=ListSink(), seed=seed).start()
+        first = play(seed=1)
+        random.seed(2)
+        second = play(seed=1)
+        self.assertIsNotNone(first)
+        self.assertIsNotNone(second)
+        self.assertEqual(first["attack_results"], second["attack_results"])
+        self.assertEqual([str(attack) for attack in first["history"]],
+                         [str(attack) for attack in second["history"]])
+
+    def test_players(self):
+        for players in [3, 4]:
+            logics = [MaxEntropy()] + [EpsilonGreedy(epsilon=0.5) for _ in range(players - 1)]
+            outputs = Game(logics=logics, sink=ListSink(), seed=0).start()
+            self.assertIsNotNone(outputs)
+            self.assertIn(outputs["winner"], range(players))
+            self.assertEqual(players, len(outputs["skip_count"]))
+
+    def test_deck_config(self):
+        with self.assertRaisesRegex(Exception, "MAX_NUMBER"):
+            Game(logics=[EpsilonGreedy(), EpsilonGreedy()], numbers=list(range(16)))
+        with self.assertRaisesRegex(Exception, "colors"):
+            Game(logics=[EpsilonGreedy(), EpsilonGreedy()], colors=['B', 'W', 'R'])
+
+    def test_profile(self):
+        game = Game(logics=[EpsilonGreedy(), EpsilonGreedy()],
+                    sink=ListSink(), profile=True, seed=1)
+        outputs = game.start()
+        self.assertIsNotNone(outputs)
+        self.assertEqual([0, 1], sorted(outputs["profile"].keys()))
+        acts = outputs["profile"][0]["acts"] + outputs["profile"][1]["acts"]
+        self.assertEqual(len(outputs["profiles"]), acts)
+        for profile in outputs["profiles"]:
+            self.assertEqual(1, profile["calls"]["count"])
+            self.assertIn("candidates", profile["counts"])
+
+    def test_profile_reuse(self):
+        logics = [EpsilonGreedy(), EpsilonGreedy()]
+        self.assertIn("profile", Game(logics=logics, sink=ListSink(), profile=True, seed=1).start())
+        outputs = Game(logics=logics, sink=ListSink(), seed=2).start()
+        self.assertNotIn("profiles", outputs)
+        # profiles of a timed-out game are kept
+        game = Game(logics=logics, sink=ListSink(), profile=True, seed=1, max_turns=2)
+        self.assertIsNone(game.start())
+        self.assertIsNone(game.outputs["winner"])
+        self.assertEqual(len(game.outputs["profiles"]),
+                         sum(profile["acts"] for profile in game.outputs["profile"].values()))
+        self.assertGreaterEqual(len(game.outputs["profiles"]), 2)
+
+
+class CountingPacer(Pacer):
+    def __init__(self):
+        self.paces = 0
+
+    def pace(self):
+        self.paces += 1
+
+
+class PacerTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_pace(self):
+        # a pace before judging each attack, in start and start_async
+        for start in [lambda game: game.start(), lambda game: asyncio.run(game.start_async())]:
+            pacer = CountingPacer()
+            outputs = start(Game(logics=[EpsilonGreedy(), EpsilonGreedy()], sink=ListSink(), pacer=pacer, seed=0))
+            self.assertIsNotNone(outputs)
+            self.assertEqual(len(outputs["attack_results"]), pacer.paces)
+
+    def test_sleep(self):
+        pacer = SleepPacer(seconds=0.01)
+        with unittest.mock.patch("tools.pacer.time.sleep") as sleep:
+            pacer.pace()
+        sleep.assert_called_once_with(0.01)
+
+        # pace_async lets other coroutines run while it waits
+        async def run():
+            order = []
+
+            async def pace():
+                await pacer.pace_async()
+                order.append("pace")
+
+            async def other():
+                order.append("other")
+            await asyncio.gather(pace(), other())
+            return order
+        self.assertEqual(["other", "pace"], asyncio.run(run()))
+
+
+class HistoryIndexTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_sync(self):
+        history = [Attack(card_id=3, position=0, color='B', number=2, attacked_to=1, attacked_by=0),
+                   Attack(card_id=5, position=1, color='W', number=4, attacked_to=1, attacked_by=0)]
+        index = index_history(history)
+        self.assertEqual({CardContent('B', 2).to_code()}, index.tried_cards(3))
+
+        history.append(Attack(card_id=3, position=0, color='B', number=7, attacked_to=1, attacked_by=0))
+        index = index_history(history)
+        self.assertEqual({CardContent('B', 2).to_code(), CardContent('B', 7).to_code()},
+                         index.tried_cards(3))
+        self.assertEqual(set(), index.tried_cards(4))
+
+
+class TrackedEpsilonGreedy(EpsilonGreedy):
+    def __init__(self, test_case: unittest.TestCase):
+        super().__init__(epsilon=0.5)
+        self.test_case = test_case
+        self.hands_tracker = BeliefTracker()
+
+    def act(self, player, opponents, new_card, opened_cards, history, has_succeeded):
+        self.hands_tracker.update(player=player, opponents=opponents, opened_cards=opened_cards,
+                                  new_card=new_card, history=history)
+        expected = calculate_candidate_matrices(player=player, opened_cards=opened_cards, new_card=new_card,
+                                                opponents=opponents, history=history)
+        actual = self.hands_tracker.candidate_matrices()
+        self.test_case.assertEqual(expected.keys(), actual.keys())
+        for opponent_id in expected:
+            self.test_case.assertEqual(expected[opponent_id].tolist(),
+                                       actual[opponent_id].tolist())
+        self.test_case.assertEqual(count_hand_candidates(player=player, opened_cards=opened_cards, new_card=new_card,
+                                                         opponents=opponents, history=history),
+                                   self.hands_tracker.count())
+        # counting is the same as enumerating
+        total, attacks_with_proba = calculate_attacks_with_proba(player=player, opened_cards=opened_cards, new_card=new_card,
+                                                                 opponents=opponents, history=history)
+        hands = calculate_hand_candidates(player=player, opened_cards=opened_cards, new_card=new_card,
+                                          opponents=opponents, history=history)
+        self.test_case.assertEqual(len(hands), total)
+        self.test_case.assertEqual(
+            sorted((str(attack), proba) for attack, proba in attacks_with_proba),
+            sorted((str(attack), proba) for attack, proba in transform_candidates_from_hand_to_attack(
+                candidate_hands_list=hands, opponents=opponents, player=player)))
+        return super().act(player, opponents, new_card, opened_cards, history, has_succeeded)
+
+
+class BeliefTrackerTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_recomputation(self):
+        logics = [TrackedEpsilonGreedy(self), TrackedEpsilonGreedy(self)]
+        for seed in range(3):
+            Game(logics=logics, sink=ListSink(), seed=seed).start()
+
+
+class TranspositionTableTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_lru(self):
+        table = TranspositionTable(max_size=2)
+        table.put("a", 1)
+        table.put("b", 2)
+        self.assertEqual(1, table.get("a"))
+        table.put("c", 3)
+        # "b" is the least recently used
+        self.assertIsNone(table.get("b"))
+        self.assertEqual(3, table.get("c"))
+        self.assertEqual({"hits": 2, "misses": 1, "evictions": 1, "size": 2},
+                         table.stats())
+        table.reset()
+        self.assertEqual({"hits": 0, "misses": 0, "evictions": 0, "size": 0},
+                         table.stats())
+
+    def test_fingerprint(self):
+        matrix = np.arange(40000, dtype=np.int16).reshape(-1, 4)
+        key = fingerprint(matrix)
+        self.assertEqual(key, fingerprint(matrix.copy()))
+        self.assertNotEqual(key, fingerprint(matrix[:-1]))
+        self.assertNotEqual(key, fingerprint(matrix[::-1]))
+        # the size of a key doesn't depend on the matrix
+        self.assertEqual(16, len(key[1]))
+
+    def test_cleared_after_move(self):
+        logic = MaxEntropy()
+        Game(logics=[logic, EpsilonGreedy()], sink=ListSink(), seed=0, max_turns=4).start()
+        self.assertEqual(0, logic.table.stats()["size"])
+
+
+class SimulationPlayerTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_player(self):
+        hands = Hands(cards=[Card(color='B', number=1, opened=False, owned_by=1, card_id=1),
+                             Card(color='W', number=3, opened=True,
+                                  owned_by=1, card_id=15),
+                             Card(color='W', number=7, opened=False, owned_by=1, card_id=19)])
+        player = Player(player_id=1, hands=hands)
+        simulation = SimulationPlayer.from_player(player, referred_by=0)
+        self.assertEqual(hands.get_closed_cards(),
+                         simulation.hands.get_closed_cards())
+        self.assertEqual(hands.get_opened_codes(),
+                         simulation.hands.get_opened_codes())
+        self.assertEqual(str(hands), str(simulation.hands))
+
+        # open and insert like Player, then restore
+        simulation.open(position=2, code=Card(color='W', number=7).get_code())
+        opened = Player(player_id=1, hands=hands)
+        opened.open(position=2)
+        self.assertEqual(opened.hands.get_opened_codes(),
+                         simulation.hands.get_opened_codes())
+        simulation.undo()
+        self.assertEqual(hands.get_closed_cards(),
+                         simulation.hands.get_closed_cards())
+        self.assertEqual([None, Card(color='W', number=3).get_code(), None],
+                         simulation.hands.codes)
+
+        own = SimulationPlayer.from_player(player, referred_by=1)
+        position = own.insert(Card(color='B', number=5).get_code())
+        inserted = Player(player_id=1, hands=hands)
+        self.assertEqual(inserted.insert(Card(color='B', number=5, opened=False)), position)
+        self.assertEqual(inserted.hands.get_codes(referred_by=1),
+                         own.hands.get_codes(referred_by=1))
+        self.assertEqual(inserted.hands.get_closed_cards(),
+                         own.hands.get_closed_cards())
+        own.undo()
+        self.assertEqual(hands.get_codes(referred_by=1),
+                         own.hands.get_codes(referred_by=1))
+
+
+class SampledMaxEntropy(MaxEntropy):
+    def __init__(self, test_case: unittest.TestCase):
+        super().__init__(max_candidates=10, hand_samples=5, max_depth=2)
+        self.test_case = test_case
+        self.sampled_acts = 0
+        self.missing_samples = 0
+
+    def act(self, player, opponents, new_card, opened_cards, history, has_succeeded):
+        attack, meta = super().act(player, opponents, new_card, opened_cards, history, has_succeeded)
+        if len(self.tracker.sampled_opponents()) == 0 or new_card is None:
+            return attack, meta
+        self.sampled_acts += 1
+        # probabilities of attacks are exact even if hands are sampled
+        _, attacks_with_proba = calculate_attacks_with_proba(player=player, opened_cards=opened_cards, new_card=new_card,
+                                                             opponents=opponents, history=history)
+        if attack is not None:
+            self.test_case.assertAlmostEqual(dict(attacks_with_proba)[attack], meta["proba"])
+        # the success of an attack which no sample has is not a win
+        matrices = self.tracker.candidate_matrices(samples=1, rng=np.random.default_rng(0))
+        for missing, proba in attacks_with_proba:
+            matrix = matrices[missing.attacked_to]
+            if proba < 1 and not np.any(matrix[:, missing.position] == missing.card_content.to_code()):
+                break
+        else:
+            return attack, meta
+        self.missing_samples += 1
+        arguments = dict(candidate_matrices=matrices, opponents=opponents, player=player,
+                         opened_cards=opened_cards, new_card=new_card, history=history, max_samples=1)
+        _, gain = maximize_entropy(attacks_with_proba=[(missing, proba)], phase1_max_num=3, max_depth=2,
+                                   rng=random.Random(0), **arguments)
+        entropy_opened, _ = estimate_self_entropy(rng=random.Random(0), **arguments)
+        self.test_case.assertAlmostEqual(calculate_entropy_gain(
+            p=proba, descendant_entropy=0, entropy_opened=entropy_opened), gain)
+        return attack, meta
+
+
+class MaxEntropyTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_sampled(self):
+        logic = SampledMaxEntropy(self)
+        Game(logics=[logic, EpsilonGreedy(), EpsilonGreedy()], sink=ListSink(), seed=0, max_turns=6).start()
+        self.assertGreater(logic.sampled_acts, 0)
+        self.assertGreater(logic.missing_samples, 0)
+
+
+class TickingClock:
+    # a clock which advances a second at each call
+    def __init__(self):
+        self.ticks = 0
+
+    def __call__(self):
+        self.ticks += 1
+        return float(self.ticks - 1)
+
+
+def first_arguments(logic, players=2):
+    # arguments of act of logic at its first turn of a seeded game
+    game = Game(logics=[logic] + [EpsilonGreedy() for _ in range(players - 1)], sink=ListSink(), seed=0)
+    steps = game.steps()
+    response = None
+    while True:
+        request, payload = steps.send(response)
+        response = None
+        if request == "act":
+            acting, arguments = payload
+            if acting is logic:
+                return arguments
+            response = acting.act(**arguments)
+
+
+def first_act(logic):
+    return logic.act(**first_arguments(logic))
+
+
+class AnytimeMaxEntropyTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_schedule(self):
+        logic = AnytimeMaxEntropy(top_proba_attacks=3, max_samples=1, max_depth=2)
+        self.assertEqual([(1, 3, 1), (2, 3, 1), (2, 4, 2), (2, 5, 3)],
+                         list(logic.schedule(attacks_num=5, candidates_num=3)))
+
+    def test_time_budget(self):
+        # a clock which stops: every search is completed
+        attack, meta = first_act(AnytimeMaxEntropy(time_budget=1, max_depth=2, clock=lambda: 0.0))
+        self.assertIsNotNone(attack)
+        self.assertEqual(2, meta["search"]["max_depth"])
+        # no time: the attack with the highest probability is chosen
+        attack, meta = first_act(AnytimeMaxEntropy(time_budget=0, max_depth=2, clock=TickingClock()))
+        self.assertIsNotNone(attack)
+        self.assertIsNone(meta["search"])
+        # the search runs until the clock passes the deadline
+        clock = TickingClock()
+        logic = AnytimeMaxEntropy(time_budget=50, max_depth=3, clock=clock)
+        arguments = first_arguments(logic)
+        attack, meta = logic.act(**arguments)
+        self.assertGreater(clock.ticks - 1, 50)
+        _, attacks_with_proba = calculate_attacks_with_proba(**{key: value for key, value in arguments.items()
+                                                                if key != "has_succeeded"})
+        self.assertIn(attack, dict(attacks_with_proba))
+
+    def test_samples_per_opponent(self):
+        # max_samples is not increased beyond the candidates of an opponent
+        logic = AnytimeMaxEntropy(time_budget=1, max_depth=1, clock=lambda: 0.0)
+        arguments = first_arguments(logic, players=3)
+        _, meta = logic.act(**arguments)
+        self.assertLessEqual(meta["search"]["max_samples"],
+                             max(len(matrix) for matrix in logic.tracker.candidate_matrices().values()))
+
+
+class BenchmarkTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_json_lines(self):
+        output = io.StringIO()
+        records = run_benchmark(output=output, games=1,
+                                max_candidates=1000, min_time=0)
+        self.assertEqual(records, [json.loads(line)
+                         for line in output.getvalue().splitlines()])
+        states = {record["state"] for record in records
+                  if record["benchmark"] == "calculate_hand_candidates"}
+        self.assertEqual({f"{players}p-{phase}" for players in [2, 3] for phase in ["early", "middle", "late"]},
+                         states)
+
+
+class OpeningBookTest(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_same_as_count(self):
+        book = OpeningBook.generate()
+        test_case = self
+
+        class CheckedEpsilonGreedy(EpsilonGreedy):
+            def act(self, player, opponents, new_card, opened_cards, history, has_succeeded):
+                opening = lookup_opening(opening_book=book, player=player, opened_cards=opened_cards,
+                                         new_card=new_card, opponents=opponents, history=history)
+                if opening is not None:
+                    candidates_num, counter = count_hand_candidates(player=player, opened_cards=opened_cards,
+                                                                    new_card=new_card, opponents=opponents,
+                                                                    history=history)
+                    test_case.assertEqual(candidates_num, opening[0])
+                    test_case.assertEqual({key: counts for key, counts in counter.items() if counts},
+                                          dict(opening[1]))
+                return super().act(player, opponents, new_card, opened_cards, history, has_succeeded)
+
+        for seed in range(3):
+            Game(logics=[CheckedEpsilonGreedy(opening_book=book), CheckedEpsilonGreedy()],
+                 sink=ListSink(), seed=seed).start()
+            Game(logics=[CheckedEpsilonGreedy(), CheckedEpsilonGreedy(), CheckedEpsilonGreedy(opening_book=book)],
+                 sink=ListSink(), seed=seed).start()
+            Game(logics=[MaxEntropy(opening_book=book), CheckedEpsilonGreedy()],
+                 sink=ListSink(), seed=seed).start()
+
+    def test_max_entropy(self):
+        # the book answers the first move without hands and the search
+        book = OpeningBook.generate()
+        with unittest.mock.patch.object(MaxEntropy, "build_matrices") as build_matrices, \
+                unittest.mock.patch.object(MaxEntropy, "search") as search:
+            attack, meta = first_act(MaxEntropy(opening_book=book))
+        build_matrices.assert_not_called()
+        search.assert_not_called()
+        self.assertTrue(meta["opening_book"])
+        # the most probable attacks
+        _, greedy_meta = first_act(EpsilonGreedy())
+        self.assertIsNotNone(attack)
+        self.assertAlmostEqual(greedy_meta["proba"], meta["proba"])
+        for seed in range(3):
+            outputs = Game(logics=[MaxEntropy(opening_book=book), EpsilonGreedy()], sink=ListSink(), seed=seed).start()
+            self.assertIsNotNone(outputs)
+
+    def test_deck_config(self):
+        # codes of the deck are not 0..K-1
+        colors, numbers = ['B', 'W'], list(range(2, 8))
+        book = OpeningBook.generate(colors=colors, numbers=numbers, max_hands=2)
+        codes = sorted(encode(color=color, number=number) for color in colors for number in numbers)
+        for known in [codes[:3], codes[-3:], codes[1:7:2]]:
+            for opponent_colors in itertools.product(colors, repeat=2):
+                expected = [dict() for _ in opponent_colors]
+                for hands in itertools.combinations([code for code in codes if code not in known], 2):
+                    if [decode(code)[0] for code in hands] == list(opponent_colors):
+                        for position, code in enumerate(hands):
+                            expected[position][code] = expected[position].get(code, 0) + 1
+                self.assertEqual(expected, book.lookup(known_codes=known, colors=list(opponent_colors)))
+
+    def test_config(self):
+        book = OpeningBook.generate(numbers=list(range(6)), max_hands=2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "opening_book.npy")
+            book.save(path)
+            loaded = OpeningBook.load(path, numbers=list(range(6)), max_hands=2)
+            np.testing.assert_array_equal(book.counts, loaded.counts)
+            with self.assertRaisesRegex(Exception, "another config"):
+                OpeningBook.load(path)
+
+
+class SolverCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "solver_cache.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def play(self, solver_cache):
+        results = []
+        for players in [2, 3]:
+            for seed in range(3):
+                outputs = Game(logics=[EpsilonGreedy(solver_cache=solver_cache) for _ in range(players)],
+                               sink=ListSink(), seed=seed).start()
+                results.append(None if outputs is None else
+                               (outputs["winner"], outputs["attack_results"], outputs["proba_list"]))
+        return results
+
+    def test_same_results(self):
+        expected = self.play(solver_cache=None)
+        cache = SolverCache(self.path)
+        self.assertEqual(expected, self.play(solver_cache=cache))
+        self.assertEqual(0, cache.stats()["hits"])
+        cache.close()
+
+        # the next run reads the file
+        cache = SolverCache(self.path)
+        self.assertEqual(expected, self.play(solver_cache=cache))
+        self.assertEqual(0, cache.stats()["misses"])
+        cache.close()
+
+    def test_eviction(self):
+        cache = SolverCache(self.path, max_entries=10)
+        # the size is checked every EVICTION_INTERVAL puts
+        for i in range(200):
+            cache.put(str(i), (i, []))
+        self.assertEqual(10, cache.size())
+        self.assertEqual((199, []), tuple(cache.get("199")))
+        self.assertIsNone(cache.get("0"))
+        cache.close()
+
+    def test_config(self):
+        cache = SolverCache(self.path)
+        cache.put("key", (1, []))
+        cache.close()
+        with self.assertRaises(Exception):
+            SolverCache(self.path, config={**solver_config(), "numbers": list(range(16))}).get("key")
+        cache = SolverCache(self.path)
+        self.assertEqual([1, []], cache.get("key"))
+        cache.close()
+
+
+class RecordingEpsilonGreedy(EpsilonGreedy):
+    def __init__(self):
+        super().__init__(epsilon=0.5)
+        self.states = []
+
+    def act(self, player, opponents, new_card, opened_cards, history, has_succeeded):
+        self.states.append((player.hands.debug(), [str(opponent.hands) for opponent in opponents],
+                            str(new_card), str(opened_cards), str(history), has_succeeded))
+        return super().act(player, opponents, new_card, opened_cards, history, has_succeeded)
+
+
+class GameLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "games.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replay(self):
+        games = []
+        for players in [2, 3]:
+            for seed in range(3):
+                logics = [RecordingEpsilonGreedy() for _ in range(players)]
+                outputs = Game(logics=logics, sink=GameLogSink(self.path), seed=seed, max_turns=20).start()
+                games.append((logics, outputs))
+        logs = list(read_game_logs(self.path))
+        self.assertEqual(len(games), len(logs))
+
+        for (logics, outputs), log in zip(games, logs):
+            replay = Replay(log)
+            replayed = replay.run()
+            self.assertEqual(outputs is None, replayed is None)
+            if outputs is not None:
+                for key in ["winner", "turns", "attack_results", "proba_list", "skip_count"]:
+                    self.assertEqual(outputs[key], replayed[key])
+
+            # the same arguments as the logics got
+            states = [iter(logic.states) for logic in logics]
+            decisions = 0
+            for action, arguments in replay.decisions():
+                decisions += 1
+                self.assertEqual(next(states[action["player_id"]]),
+                                 (arguments["player"].hands.debug(),
+                                  [str(opponent.hands) for opponent in arguments["opponents"]],
+                                  str(arguments["new_card"]), str(arguments["opened_cards"]),
+                                  str(arguments["history"]), arguments["has_succeeded"]))
+            self.assertEqual(sum(len(logic.states) for logic in logics), decisions)
+            last = [action for action in log["actions"] if action["type"] != "insert"][-1]
+            self.assertEqual(last["player_id"],
+                             replay.decision(decisions - 1)["player"].player_id)
+
+
+class TournamentTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "results.jsonl")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_tournament(self, trials, output):
+        matchups = {"greedy": [EpsilonGreedy(), EpsilonGreedy(epsilon=0.5)],
+                    "max_entropy": [MaxEntropy(), EpsilonGreedy()]}
+        return Tournament(matchups=matchups, trials=trials, workers=1, output=output).run()
+
+    def test_resume(self):
+        expected = self.run_tournament(trials=6, output=None)
+        self.run_tournament(trials=3, output=self.path)
+        # interrupted while writing a record
+        with open(self.path, "a") as file:
+            file.write('{"matchup": "gre')
+        results = self.run_tournament(trials=6, output=self.path)
+        for name, result in expected.items():
+            self.assertEqual(result.wins, results[name].wins)
+            self.assertEqual(result.turn_histogram, results[name].turn_histogram)
+            self.assertEqual(result.calibration(), results[name].calibration())
+        with open(self.path) as file:
+            self.assertEqual(12, len(file.readlines()))
+
+    def test_workers(self):
+        # the same results for any number of workers
+        expected = Tournament(matchups={"max_entropy": [MaxEntropy(), EpsilonGreedy(epsilon=0.5)]},
+                              trials=4, workers=1).run()["max_entropy"]
+        for workers in [1, 2]:
+            result = Tournament(matchups={"max_entropy": [MaxEntropy(), EpsilonGreedy(epsilon=0.5)]},
+                                trials=4, workers=workers).run()["max_entropy"]
+            self.assertEqual(expected.wins, result.wins)
+            self.assertEqual(expected.turn_histogram, result.turn_histogram)
+            self.assertEqual(expected.calibration(), result.calibration())
+
+    def test_resume_with_another_seed(self):
+        self.run_tournament(trials=2, output=self.path)
+        with self.assertRaises(Exception):
+            Tournament(matchups={"greedy": [EpsilonGreedy(), EpsilonGreedy(epsilon=0.5)]},
+                       trials=4, workers=1, seed=1, output=self.path).run()
+        # fewer trials use the first recorded games
+        results = self.run_tournament(trials=1, output=self.path)
+        self.assertEqual(1, results["greedy"].games())
+
+    def test_timeout(self):
+        # attacks of games without a winner are aggregated too
+        results = Tournament(matchups={"greedy": [EpsilonGreedy(), EpsilonGreedy()]}, trials=3,
+                             workers=1, game_options={"max_turns": 2}).run()
+        self.assertEqual(3, results["greedy"].draws)
+        self.assertGreaterEqual(sum(entry["attacks"] for entry in results["greedy"].calibration()), 6)
+
+    def test_unseeded_logics(self):
+        # logics of an unseeded game can be copied and sent to workers
+        logics = [EpsilonGreedy(), EpsilonGreedy()]
+        Game(logics=logics, sink=ListSink()).start()
+        for workers in [1, 2]:
+            results = Tournament(matchups={"greedy": logics}, trials=2, workers=workers).run()
+            self.assertEqual(2, results["greedy"].games())
+
+    def test_no_games(self):
+        results = Tournament(matchups={"greedy": [EpsilonGreedy(), EpsilonGreedy()]}, trials=0, workers=1).run()
+        self.assertEqual(0.0, results["greedy"].win_rate())
+        self.assertEqual((0.0, 1.0), results["greedy"].confidence_interval())
+        self.assertIn("0 games", repr(results["greedy"]))
+
+    def test_calibration(self):
+        results = self.run_tournament(trials=4, output=None)
+        calibration = results["greedy"].calibration()
+        self.assertTrue(len(calibration) > 0)
+        for entry in calibration:
+            self.assertLessEqual(entry["bin"][0], entry["mean_proba"])
+            self.assertLessEqual(entry["mean_proba"], entry["bin"][1])
+            self.assertLessEqual(entry["success_rate"], 1)
+
+
+class SlowEpsilonGreedy(EpsilonGreedy):
+    def act(self, player, opponents, new_card, opened_cards, history, has_succeeded):
+        time.sleep(1)
+        return super().act(player, opponents, new_card, opened_cards, history, has_succeeded)
+
+
+def scripted_choose(seed):
+    rng = random.Random(seed)
+    state = {"errors": 0}
+
+    def choose(request):
+        # an invalid skip first, then random guesses on closed cards
+        if state["errors"] == 0:
+            state["errors"] += 1
+            return {"skip": True} if not request["has_succeeded"] else {"position": -1}
+        if request["has_succeeded"]:
+            return {"skip": True}
+        opponent = request["opponents"][0]
+        position = next(i for i, card in enumerate(opponent["hands"]) if not card["opened"])
+        return {"position": position, "color": opponent["hands"][position]["color"],
+                "number": rng.randint(0, 11), "attacked_to": opponent["player_id"]}
+    return choose
+
+
+class GameServerTest(unittest.TestCase):
+    def setUp(self):
+        self.executor = ProcessPoolExecutor(
+            max_workers=2, mp_context=multiprocessing.get_context("forkserver"))
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_concurrent_matches(self):
+        async def run():
+            server = GameServer(cpu_factory=EpsilonGreedy, executor=self.executor, seed=0)
+            await server.start()
+            messages = await asyncio.gather(*[play_client("127.0.0.1", server.port, scripted_choose(i))
+                                              for i in range(4)])
+            await server.close()
+            return server, messages
+
+        server, messages = asyncio.run(run())
+        self.assertEqual(4, len(server.results))
+        self.assertEqual([0, 0, 1, 1], sorted(
+            result["human_player"] for result in server.results))
+        for client_messages in messages:
+            events = [message["event"] for message in client_messages]
+            self.assertEqual("match", events[0])
+            self.assertIn(events[-1], ["game_over", "timeout"])
+            self.assertIn("error", events)
+            # the deck order is not sent
+            game_start = next(message for message in client_messages if message["event"] == "game_start")
+            self.assertNotIn("deck", game_start)
+
+    def test_slow_logic(self):
+        # a slow logic in a match doesn't block the others
+        async def run():
+            slow = GameServer(cpu_factory=SlowEpsilonGreedy, executor=self.executor, seed=0, max_turns=2)
+            fast = GameServer(cpu_factory=EpsilonGreedy, executor=self.executor, seed=0)
+            await slow.start()
+            await fast.start()
+            finished = []
+
+            async def play(server, name):
+                await play_client("127.0.0.1", server.port, scripted_choose(0))
+                finished.append(name)
+
+            await asyncio.gather(play(slow, "slow"), play(fast, "fast"))
+            await slow.close()
+            await fast.close()
+            return finished
+
+        self.assertEqual(["fast", "slow"], asyncio.run(run()))
+
+
 if __name__ == "__main__":
     unittest.main()
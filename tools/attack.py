@@ -1,13 +1,23 @@
+from operator import itemgetter
 from tools.card import CardContent
 
 
-class Attack:
-    def __init__(self, card_id: int, position: int, color: str, number: int, attacked_to: int, attacked_by: int):
-        self.card_id = card_id
-        self.position = position
-        self.card_content = CardContent(color=color, number=number)
-        self.attacked_to = attacked_to
-        self.attacked_by = attacked_by
+class Attack(tuple):
+    # An immutable tuple of (card_id, position, card_content, attacked_to, attacked_by)
+    # like a namedtuple, compared and hashed by all of them.
+    __slots__ = ()
+    card_id = property(itemgetter(0))
+    position = property(itemgetter(1))
+    card_content = property(itemgetter(2))
+    attacked_to = property(itemgetter(3))
+    attacked_by = property(itemgetter(4))
+
+    def __new__(cls, card_id: int, position: int, color: str, number: int, attacked_to: int, attacked_by: int) -> 'Attack':
+        return tuple.__new__(cls, (card_id, position, CardContent(color=color, number=number), attacked_to, attacked_by))
+
+    def __getnewargs__(self):
+        return (self.card_id, self.position, self.card_content.color, self.card_content.number,
+                self.attacked_to, self.attacked_by)
 
     def __repr__(self) -> str:
         return f"{self.card_content} at {self.position} (Player{self.attacked_by} -> Player{self.attacked_to})"
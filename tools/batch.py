@@ -0,0 +1,235 @@
+from abc import ABC, abstractmethod
+from typing import Any, Optional, Tuple
+import numpy as np
+from tools.card import encode
+from tools.consts import COLORS, NUMBERS, MAX_HANDS, MAX_TURNS
+from tools.counting import batch_count_ascending
+
+
+class BatchState:
+    # Many games held in stacked arrays. Cards are indexed by their codes,
+    # so the cards owned by a player are the hands in ascending order.
+    # Codes are int16, so larger decks don't wrap around.
+    def __init__(self, games: int, players: int, colors: list[str], numbers: list[int], rng: np.random.Generator):
+        self.games = games
+        self.players = players
+        self.codes = max(encode(color=color, number=number)
+                         for color in colors for number in numbers) + 1
+        self.colors = np.asarray(
+            [code % len(COLORS) for code in range(self.codes)], dtype=np.int8)
+        # owner of each card, -1 for cards in the deck or drawn but not inserted yet
+        self.owner = np.full((games, self.codes), -1, dtype=np.int8)
+        self.opened = np.zeros((games, self.codes), dtype=bool)
+        # failed attacks: tried[g, card, code]
+        self.tried = np.zeros((games, self.codes, self.codes), dtype=bool)
+        # the deck is drawn from the end
+        valid = [encode(color=color, number=number)
+                 for color in colors for number in numbers]
+        self.deck = rng.permuted(
+            np.tile(np.asarray(valid, dtype=np.int16), (games, 1)), axis=1)
+        self.deck_size = np.full(games, len(valid))
+        # the card drawn by the attacker in this turn, -1 if the deck is empty
+        self.new_card = np.full(games, -1, dtype=np.int16)
+        self.attacker = np.zeros(games, dtype=np.int8)
+        self.turn = np.zeros(games, dtype=np.int32)
+        self.has_succeeded = np.zeros(games, dtype=bool)
+        self.losers = np.zeros(games, dtype=np.int8)
+        self.active = np.ones(games, dtype=bool)
+        self.winner = np.full(games, -1, dtype=np.int8)
+
+    def draw(self, games: np.ndarray) -> np.ndarray:
+        # -1 for games with an empty deck
+        cards = np.full(len(games), -1, dtype=np.int16)
+        has_card = self.deck_size[games] > 0
+        drawing = games[has_card]
+        self.deck_size[drawing] -= 1
+        cards[has_card] = self.deck[drawing, self.deck_size[drawing]]
+        return cards
+
+    def hands(self, games: np.ndarray, player_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Codes of hands (games x positions) padded with -1, and their lengths.
+        owned = self.owner[games] == player_ids[:, np.newaxis]
+        lengths = owned.sum(axis=1)
+        width = int(lengths.max()) if len(games) > 0 else 0
+        # owned codes first, in ascending order
+        order = np.argsort(~owned, axis=1, kind="stable")[:, :width]
+        codes = np.where(np.arange(width)[np.newaxis, :] < lengths[:, np.newaxis], order, -1)
+        return codes, lengths
+
+    def impossible(self, games: np.ndarray, player_ids: np.ndarray) -> np.ndarray:
+        # Codes which can't be in closed cards of opponents for the players.
+        impossible = (self.opened[games] & (self.owner[games] >= 0)) | \
+            (self.owner[games] == player_ids[:, np.newaxis])
+        has_card = self.new_card[games] >= 0
+        impossible[np.nonzero(has_card)[0], self.new_card[games][has_card]] = True
+        return impossible
+
+
+def calculate_batch_attacks_with_proba(state: BatchState, games: np.ndarray, attacked_to: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Probabilities of attacks on an opponent for the attackers of games,
+    # like count_hand_candidates with a single opponent.
+    # Returns codes of hands (games x positions) and the probabilities
+    # (games x positions x codes), which are 0 for opened cards and padding.
+    codes, lengths = state.hands(games=games, player_ids=attacked_to)
+    width = codes.shape[1]
+    valid = codes >= 0
+    safe_codes = np.where(valid, codes, 0)
+    opened = valid & state.opened[games[:, np.newaxis], safe_codes]
+    closed = valid & ~opened
+
+    # candidates of closed cards: same color, not visible and not tried
+    impossible = state.impossible(games=games, player_ids=state.attacker[games])
+    same_color = state.colors[np.newaxis, np.newaxis, :] == state.colors[safe_codes][:, :, np.newaxis]
+    candidates = same_color & ~impossible[:, np.newaxis, :] & \
+        ~state.tried[games[:, np.newaxis], safe_codes]
+
+    # codes above all codes pad shorter hands
+    domains = np.zeros((len(games), width, state.codes + width), dtype=bool)
+    domains[:, :, :state.codes] = np.where(closed[:, :, np.newaxis], candidates, False)
+    opened_rows, opened_positions = np.nonzero(opened)
+    domains[opened_rows, opened_positions, codes[opened_rows, opened_positions]] = True
+    padded_rows, padded_positions = np.nonzero(~valid)
+    domains[padded_rows, padded_positions, state.codes + padded_positions] = True
+
+    totals, marginals = batch_count_ascending(domains)
+    proba = marginals[:, :, :state.codes] / np.maximum(totals, 1)[:, np.newaxis, np.newaxis]
+    proba[~np.broadcast_to(closed[:, :, np.newaxis], proba.shape)] = 0
+    return codes, proba
+
+
+class BatchLogicBase(ABC):
+    @abstractmethod
+    def act_batch(self, state: BatchState, games: np.ndarray,
+                  rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Choose attacks of the attackers in games at once.
+        # Returns skip (bool), attacked_to, position, code and proba of each game.
+        pass
+
+
+class BatchEpsilonGreedy(BatchLogicBase):
+    # EpsilonGreedy for many games: attack one of the attacks with the highest probability.
+    def __init__(self, epsilon: float = 0, name: Optional[str] = None):
+        self.epsilon = epsilon
+        self.name = f"batch_e_greedy(e={epsilon})" if name is None else name
+
+    def act_batch(self, state: BatchState, games: np.ndarray,
+                  rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # skip the next attack
+        skip = state.has_succeeded[games] & (rng.random(len(games)) <= self.epsilon)
+
+        # probabilities of all attacks on all opponents side by side
+        blocks = []
+        for offset in range(1, state.players):
+            opponent_ids = (state.attacker[games].astype(np.int64) + offset) % state.players
+            _, proba = calculate_batch_attacks_with_proba(
+                state=state, games=games, attacked_to=opponent_ids)
+            blocks.append(proba.reshape(len(games), -1))
+        flat = np.concatenate(blocks, axis=1)
+        starts = np.cumsum([0] + [block.shape[1] for block in blocks])
+
+        # one of the attacks with the highest probability at random
+        max_proba = flat.max(axis=1)
+        if (max_proba <= 0).any():
+            # the true code of a closed card is always a candidate
+            raise Exception("No attack has a positive probability. The state is inconsistent.")
+        ties = (flat > 0) & (flat >= max_proba[:, np.newaxis] - 0.0001)
+        index = np.where(ties, rng.random(flat.shape), -1.0).argmax(axis=1)
+        offsets = np.searchsorted(starts, index, side="right") - 1
+        local = index - starts[offsets]
+        attacked_to = (state.attacker[games].astype(np.int64) + 1 + offsets) % state.players
+        return skip, attacked_to, local // state.codes, local % state.codes, flat[np.arange(len(games)), index]
+
+
+class BatchGame:
+    # Play many games in lockstep. Each step, every active game takes one action
+    # (an attack or a skip), and the logic of each seat acts for all its games at once.
+    def __init__(self, logics: list[BatchLogicBase], games: int, colors: list[str] = COLORS,
+                 numbers: list[int] = NUMBERS, max_turns: int = MAX_TURNS,
+                 max_hands: int = MAX_HANDS, seed: Any = None):
+        self.logics = logics
+        self.games = games
+        self.colors = colors
+        self.numbers = numbers
+        self.max_turns = max_turns
+        self.max_hands = max_hands
+        self.seed = seed
+
+    def start(self) -> dict[str, Any]:
+        rng = np.random.default_rng(self.seed)
+        players = len(self.logics)
+        state = BatchState(games=self.games, players=players,
+                           colors=self.colors, numbers=self.numbers, rng=rng)
+        all_games = np.arange(self.games)
+        for player_id in range(players):
+            for _ in range(self.max_hands):
+                state.owner[all_games, state.draw(all_games)] = player_id
+
+        attacks = np.zeros(self.games, dtype=np.int32)
+        successes = np.zeros(self.games, dtype=np.int32)
+        turns = np.zeros(self.games, dtype=np.int32)
+        starting = np.ones(self.games, dtype=bool)
+        while state.active.any():
+            # begin turns
+            beginning = np.nonzero(starting & state.active)[0]
+            state.turn[beginning] += 1
+            timeout = beginning[state.turn[beginning] > self.max_turns]
+            state.active[timeout] = False
+            beginning = beginning[state.turn[beginning] <= self.max_turns]
+            state.new_card[beginning] = state.draw(beginning)
+            state.has_succeeded[beginning] = False
+            starting[:] = False
+
+            # attackers change while the seats act
+            attackers = state.attacker.copy()
+            for seat, logic in enumerate(self.logics):
+                games = np.nonzero(state.active & (attackers == seat))[0]
+                if len(games) == 0:
+                    continue
+                skip, attacked_to, positions, codes, _ = logic.act_batch(
+                    state=state, games=games, rng=rng)
+                if (skip & ~state.has_succeeded[games]).any():
+                    raise Exception(
+                        "You can't skip your next attack because your attack has not succeeded yet.")
+                ending = list(games[skip])
+
+                attacking = games[~skip]
+                attacked_to, positions, codes = attacked_to[~skip], positions[~skip], codes[~skip]
+                hands, _ = state.hands(games=attacking, player_ids=attacked_to)
+                targets = hands[np.arange(len(attacking)), positions]
+                if (state.opened[attacking, targets]).any():
+                    raise Exception("The attacked card is already opened.")
+                attacks[attacking] += 1
+                result = targets == codes
+
+                # success
+                succeeded = attacking[result]
+                successes[succeeded] += 1
+                state.opened[succeeded, targets[result]] = True
+                state.has_succeeded[succeeded] = True
+                closed_left = ((state.owner[succeeded] == attacked_to[result][:, np.newaxis])
+                               & ~state.opened[succeeded]).any(axis=1)
+                state.losers[succeeded[~closed_left]] += 1
+                over = succeeded[state.losers[succeeded] == players - 1]
+                state.winner[over] = state.attacker[over]
+                turns[over] = state.turn[over]
+                state.active[over] = False
+
+                # failure
+                failed = attacking[~result]
+                state.tried[failed, targets[~result], codes[~result]] = True
+                has_card = failed[state.new_card[failed] >= 0]
+                state.opened[has_card, state.new_card[has_card]] = True
+                ending.extend(failed)
+
+                # end turns
+                ending = np.asarray(ending, dtype=np.int64)
+                ending = ending[state.active[ending]]
+                has_card = ending[state.new_card[ending] >= 0]
+                state.owner[has_card, state.new_card[has_card]
+                            ] = state.attacker[has_card]
+                state.new_card[ending] = -1
+                state.attacker[ending] = (state.attacker[ending] + 1) % players
+                starting[ending] = True
+
+        return {"winner": state.winner, "turns": turns,
+                "attacks": attacks, "successes": successes}
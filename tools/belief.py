@@ -0,0 +1,222 @@
+from typing import Iterable, Optional, Tuple
+import numpy as np
+from tools.attack import Attack
+from tools.card import CardContent, encode
+from tools.consts import NUMBERS
+from tools.counting import count_ascending, count_slots, enumerate_candidate_matrix, narrow_slots, sample_ascending
+from tools.history import index_history
+from tools.player import Player
+
+
+class HandBelief:
+    # What a player knows about the hands of an opponent.
+    def __init__(self, card_ids: list[Optional[int]], colors: list[str],
+                 codes: list[Optional[int]], domains: list[Optional[list[int]]]):
+        self.card_ids = card_ids
+        self.colors = colors
+        # code of each opened card, None for closed cards
+        self.codes = codes
+        # candidate codes of each closed card, None for opened cards
+        self.domains = domains
+        # candidate hands (candidates x positions), if they are tracked
+        self.matrix: Optional[np.ndarray] = None
+
+    def closed_positions(self) -> list[int]:
+        return [position for position, code in enumerate(self.codes) if code is None]
+
+    def slots(self) -> list[list[int]]:
+        return [[code] if code is not None else domain
+                for code, domain in zip(self.codes, self.domains)]
+
+
+class BeliefTracker:
+    # Keep hand candidates of opponents across turns.
+    # Between two calls of LogicBase.act, only a few things happen: attacks,
+    # openings and insertions. update() detects them from the game state and
+    # applies each of them to the candidates instead of recomputing them.
+    # The result is the same as calculate_candidate_matrices / count_hand_candidates.
+    # Hands of an opponent with more than max_rows candidates are not enumerated
+    # until they are narrowed down. They are sampled instead.
+    def __init__(self, track_hands: bool = True, max_rows: Optional[int] = None):
+        self.track_hands = track_hands
+        self.max_rows = max_rows
+        self.history: Optional[list[Attack]] = None
+        self.player_id: Optional[int] = None
+        self.processed = 0
+        self.impossible: set[int] = set()
+        self.hands: dict[int, HandBelief] = {}
+
+    def update(self, player: Player, opponents: list[Player], opened_cards: list[CardContent],
+               new_card: Optional[CardContent], history: list[Attack]) -> None:
+        impossible = self.generate_impossible(
+            player=player, opened_cards=opened_cards, new_card=new_card)
+        if (history is not self.history) or (player.player_id != self.player_id) or \
+                (len(history) < self.processed) or \
+                ([opponent.player_id for opponent in opponents] != list(self.hands.keys())):
+            self.reset(player=player, opponents=opponents,
+                       impossible=impossible, history=history)
+            return
+
+        # insertions and openings
+        for opponent in opponents:
+            belief = self.hands[opponent.player_id]
+            card_ids = [card.card_id for card in opponent.hands.cards]
+            if card_ids != belief.card_ids:
+                for position, card in enumerate(opponent.hands.cards):
+                    if card.card_id not in belief.card_ids:
+                        code = card.get_code() if card.opened else None
+                        self.on_insert(opponent_id=opponent.player_id, position=position,
+                                       card_id=card.card_id, color=card.get_color(), code=code)
+                if card_ids != belief.card_ids:
+                    # cards are not only inserted. start over.
+                    self.reset(player=player, opponents=opponents,
+                               impossible=impossible, history=history)
+                    return
+            for position, code in opponent.hands.get_opened_codes():
+                if belief.codes[position] is None:
+                    self.on_open(opponent_id=opponent.player_id,
+                                 position=position, code=code)
+
+        # attacks
+        for attack in history[self.processed:]:
+            self.on_attack(attack)
+        self.processed = len(history)
+
+        # cards which became visible
+        self.on_impossible(impossible - self.impossible)
+        self.refresh_matrices()
+
+    def reset(self, player: Player, opponents: list[Player], impossible: set[int], history: list[Attack]) -> None:
+        self.history = history
+        self.player_id = player.player_id
+        self.processed = len(history)
+        self.impossible = set(impossible)
+
+        history_index = index_history(history)
+
+        self.hands = {}
+        for opponent in opponents:
+            card_ids, colors, codes, domains = [], [], [], []
+            for card in opponent.hands.cards:
+                card_ids.append(card.card_id)
+                colors.append(card.get_color())
+                if card.opened:
+                    codes.append(card.get_code())
+                    domains.append(None)
+                else:
+                    codes.append(None)
+                    domains.append(self.generate_domain(
+                        color=card.get_color(), excluded=history_index.tried_cards(card.card_id)))
+            self.hands[opponent.player_id] = HandBelief(card_ids=card_ids, colors=colors,
+                                                        codes=codes, domains=domains)
+        self.refresh_matrices()
+
+    def refresh_matrices(self) -> None:
+        # Enumerate hands which became small enough, and drop ones which became too large.
+        if not self.track_hands:
+            return
+        for belief in self.hands.values():
+            if belief.matrix is not None:
+                if self.max_rows is not None and len(belief.matrix) > self.max_rows:
+                    belief.matrix = None
+                continue
+            if self.max_rows is not None and count_ascending(belief.slots())[0] > self.max_rows:
+                continue
+            belief.matrix = enumerate_candidate_matrix(
+                narrow_slots(belief.slots()))
+
+    def on_insert(self, opponent_id: int, position: int, card_id: Optional[int],
+                  color: str, code: Optional[int]) -> None:
+        belief = self.hands[opponent_id]
+        belief.card_ids.insert(position, card_id)
+        belief.colors.insert(position, color)
+        belief.codes.insert(position, code)
+        domain = None if code is not None else self.generate_domain(color=color)
+        belief.domains.insert(position, domain)
+        if belief.matrix is None:
+            return
+
+        # put every possible code between its neighbors in each candidate
+        matrix = belief.matrix
+        values = np.asarray([code] if code is not None else domain, dtype=np.int16)
+        keep = np.ones((len(matrix), len(values)), dtype=bool)
+        if position > 0:
+            keep &= matrix[:, position-1:position] < values[np.newaxis, :]
+        if position < matrix.shape[1]:
+            keep &= values[np.newaxis, :] < matrix[:, position:position+1]
+        rows, columns = np.nonzero(keep)
+        matrix = np.concatenate(
+            [matrix[rows, :position], values[columns, np.newaxis], matrix[rows, position:]], axis=1)
+        # keep rows in lexicographic order like enumerate_candidate_matrix
+        belief.matrix = matrix[np.lexsort(matrix.T[::-1])]
+
+    def on_open(self, opponent_id: int, position: int, code: int) -> None:
+        belief = self.hands[opponent_id]
+        belief.codes[position] = code
+        belief.domains[position] = None
+        if belief.matrix is not None:
+            belief.matrix = belief.matrix[belief.matrix[:, position] == code]
+
+    def on_attack(self, attack: Attack) -> None:
+        # A failed attack on a closed card excludes the code from it.
+        # A succeeded one has opened the card already.
+        belief = self.hands.get(attack.attacked_to)
+        if belief is None or attack.card_id not in belief.card_ids:
+            return
+        position = belief.card_ids.index(attack.card_id)
+        if belief.codes[position] is not None:
+            return
+        code = attack.card_content.to_code()
+        if code in belief.domains[position]:
+            belief.domains[position] = [
+                c for c in belief.domains[position] if c != code]
+        if belief.matrix is not None:
+            belief.matrix = belief.matrix[belief.matrix[:, position] != code]
+
+    def on_impossible(self, codes: set[int]) -> None:
+        if len(codes) == 0:
+            return
+        self.impossible |= codes
+        for belief in self.hands.values():
+            closed_positions = belief.closed_positions()
+            for position in closed_positions:
+                belief.domains[position] = [
+                    c for c in belief.domains[position] if c not in codes]
+            if belief.matrix is not None and len(closed_positions) > 0:
+                hit = np.isin(belief.matrix[:, closed_positions],
+                              list(codes)).any(axis=1)
+                belief.matrix = belief.matrix[~hit]
+
+    def generate_impossible(self, player: Player, opened_cards: list[CardContent],
+                            new_card: Optional[CardContent]) -> set[int]:
+        impossible = {card.to_code() for card in opened_cards}
+        impossible.update(player.hands.get_codes(referred_by=player.player_id))
+        if new_card is not None:
+            impossible.add(new_card.to_code())
+        return impossible
+
+    def generate_domain(self, color: str, excluded: Iterable[int] = ()) -> list[int]:
+        excluded = set(excluded)
+        return [code for code in (encode(color=color, number=number) for number in NUMBERS)
+                if code not in self.impossible and code not in excluded]
+
+    def slots_list(self) -> list[Tuple[int, list[int], list[list[int]]]]:
+        # same as build_slots of tools/logic.py
+        return [(opponent_id, belief.closed_positions(), belief.slots())
+                for opponent_id, belief in self.hands.items() if len(belief.closed_positions()) > 0]
+
+    def count(self) -> Tuple[int, dict[Tuple[int, int], dict[int, int]]]:
+        return count_slots(self.slots_list())
+
+    def candidate_matrices(self, samples: int = 1000, rng=None) -> dict[int, np.ndarray]:
+        # Hands which are not enumerated are sampled uniformly.
+        if not self.track_hands:
+            raise Exception("Hands are not tracked.")
+        return {opponent_id: belief.matrix if belief.matrix is not None
+                else sample_ascending(belief.slots(), size=samples, rng=rng)
+                for opponent_id, belief in self.hands.items()
+                if len(belief.closed_positions()) > 0}
+
+    def sampled_opponents(self) -> list[int]:
+        return [opponent_id for opponent_id, belief in self.hands.items()
+                if len(belief.closed_positions()) > 0 and belief.matrix is None]
@@ -0,0 +1,167 @@
+import copy
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable, Optional, TextIO
+import numpy as np
+from tools.attack import Attack
+from tools.card import CardContent
+from tools.events import NullSink
+from tools.game import Game
+from tools.logic import (EpsilonGreedy, LogicBase, MaxEntropy, calculate_candidate_matrices, calculate_hand_candidates,
+                         count_hand_candidates, maximize_entropy, select_attacks_with_high_proba,
+                         transform_candidates_from_hand_to_attack, transform_matrices_to_attack)
+from tools.player import Player
+
+PHASES = ["early", "middle", "late"]
+
+
+class State:
+    # Arguments of LogicBase.act at some point of a game.
+    def __init__(self, name: str, player: Player, opponents: list[Player], new_card: Optional[CardContent],
+                 opened_cards: list[CardContent], history: list[Attack], has_succeeded: bool):
+        self.name = name
+        self.player = player
+        self.opponents = opponents
+        self.new_card = new_card
+        self.opened_cards = opened_cards
+        self.history = history
+        self.has_succeeded = has_succeeded
+
+    def arguments(self) -> dict[str, Any]:
+        return dict(player=self.player, opponents=self.opponents, new_card=self.new_card,
+                    opened_cards=self.opened_cards, history=self.history)
+
+
+class Recorder(EpsilonGreedy):
+    # Keep a copy of every situation in which it acts.
+    def __init__(self):
+        super().__init__(epsilon=0)
+        self.states: list[dict[str, Any]] = []
+
+    def act(self, player, opponents, new_card, opened_cards, history, has_succeeded):
+        self.states.append(copy.deepcopy(dict(player=player, opponents=opponents, new_card=new_card,
+                                              opened_cards=opened_cards, history=history,
+                                              has_succeeded=has_succeeded)))
+        return super().act(player, opponents, new_card, opened_cards, history, has_succeeded)
+
+
+def generate_states(players: int, seed: int) -> list[State]:
+    # Early, middle and late states of a seeded game.
+    recorder = Recorder()
+    Game(logics=[recorder] * players, sink=NullSink(), seed=seed).start()
+    # the last state may have no closed cards of opponents left to attack
+    states = [state for state in recorder.states if state["new_card"] is not None] or recorder.states
+    indexes = [0, len(states) // 2, len(states) - 1]
+    return [State(name=f"{players}p-{phase}", **states[index]) for phase, index in zip(PHASES, indexes)]
+
+
+def generate_corpus(seed: int = 0) -> list[State]:
+    return generate_states(players=2, seed=seed) + generate_states(players=3, seed=seed)
+
+
+def measure(func: Callable[[], Any], min_time: float = 0.2, max_repeats: int = 1000) -> dict[str, Any]:
+    # Time repeated calls, then trace memory of a single call separately
+    # because tracing slows everything down.
+    repeats = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        repeats += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or repeats >= max_repeats:
+            break
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"repeats": repeats, "seconds": elapsed / repeats,
+            "ops_per_sec": repeats / elapsed, "peak_bytes": peak}
+
+
+def bench_hand_candidates(state: State, max_candidates: int, **options) -> dict[str, Any]:
+    candidates, _ = count_hand_candidates(**state.arguments())
+    if candidates > max_candidates:
+        return {"candidates": candidates, "skipped": "too many candidates to enumerate"}
+    return {"candidates": candidates,
+            **measure(lambda: calculate_hand_candidates(**state.arguments()), **options)}
+
+
+def bench_transform(state: State, max_candidates: int, **options) -> dict[str, Any]:
+    candidates, _ = count_hand_candidates(**state.arguments())
+    if candidates > max_candidates:
+        return {"candidates": candidates, "skipped": "too many candidates to enumerate"}
+    candidate_hands_list = calculate_hand_candidates(**state.arguments())
+    return {"candidates": candidates,
+            **measure(lambda: transform_candidates_from_hand_to_attack(candidate_hands_list=candidate_hands_list,
+                                                                       opponents=state.opponents, player=state.player),
+                      **options)}
+
+
+def bench_maximize_entropy(state: State, max_candidates: int, top_proba_attacks: int = 3,
+                           max_samples: int = 1, **options) -> dict[str, Any]:
+    candidates, _ = count_hand_candidates(**state.arguments())
+    if candidates > max_candidates or state.new_card is None:
+        return {"candidates": candidates, "skipped": "too many candidates or no new card"}
+    candidate_matrices = calculate_candidate_matrices(**state.arguments())
+    attacks_with_proba = select_attacks_with_high_proba(
+        attacks_with_proba=transform_matrices_to_attack(
+            candidate_matrices=candidate_matrices, opponents=state.opponents, player=state.player),
+        phase1_max_num=top_proba_attacks)
+
+    def search():
+        return maximize_entropy(attacks_with_proba=list(attacks_with_proba), candidate_matrices=candidate_matrices,
+                                phase1_max_num=top_proba_attacks, max_samples=max_samples, rng=random.Random(0),
+                                **state.arguments())
+    return {"candidates": candidates, **measure(search, **options)}
+
+
+def bench_games(name: str, logics: Callable[[], list[LogicBase]], seed: int, games: int) -> dict[str, Any]:
+    turns: list[int] = []
+
+    def play():
+        turns.clear()
+        for i in range(games):
+            outputs = Game(logics=logics(), sink=NullSink(),
+                           seed=seed + i).start()
+            if outputs is not None:
+                turns.append(outputs["turns"])
+    result = measure(play, min_time=0, max_repeats=1)
+    return {"benchmark": "game_start", "state": name, "games": games,
+            "seconds": result["seconds"] / games, "ops_per_sec": result["ops_per_sec"] * games,
+            "peak_bytes": result["peak_bytes"], "mean_turns": float(np.mean(turns)) if turns else None}
+
+
+STATE_BENCHMARKS = {
+    "calculate_hand_candidates": bench_hand_candidates,
+    "transform_candidates_from_hand_to_attack": bench_transform,
+    "maximize_entropy": bench_maximize_entropy,
+}
+
+
+def run(output: TextIO, seed: int = 0, games: int = 5, max_candidates: int = 200000,
+        min_time: float = 0.2, label: Optional[str] = None) -> list[dict[str, Any]]:
+    # Write a JSON line for each benchmark.
+    records = []
+
+    def write(record: dict[str, Any]) -> None:
+        if label is not None:
+            record["label"] = label
+        records.append(record)
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+    for state in generate_corpus(seed=seed):
+        for name, benchmark in STATE_BENCHMARKS.items():
+            write({"benchmark": name, "state": state.name, "players": len(state.opponents) + 1,
+                   **benchmark(state, max_candidates=max_candidates, min_time=min_time)})
+
+    matchups: dict[str, Callable[[], list[LogicBase]]] = {
+        "2p-e_greedy": lambda: [EpsilonGreedy(), EpsilonGreedy()],
+        "3p-e_greedy": lambda: [EpsilonGreedy(), EpsilonGreedy(), EpsilonGreedy()],
+        "2p-max_entropy": lambda: [MaxEntropy(), EpsilonGreedy()],
+    }
+    for name, logics in matchups.items():
+        write(bench_games(name=name, logics=logics, seed=seed, games=games))
+    return records
@@ -1,77 +1,153 @@
-from typing import Optional
+from operator import itemgetter
+from typing import Optional, Tuple
 from tools.consts import COLORS, MIN_NUMBER, MAX_NUMBER
 
 
+def encode(color: str, number: int) -> int:
+    # Compact representation of a card content used by the solver.
+    # The order of codes is the same as the order of CardContent.
+    return number * len(COLORS) + COLORS.index(color)
+
+
+def decode(code: int) -> Tuple[str, int]:
+    return COLORS[code % len(COLORS)], code // len(COLORS)
+
+
+def to_mask(codes) -> int:
+    # set of codes as a bitmask
+    mask = 0
+    for code in codes:
+        mask |= 1 << code
+    return mask
+
+
 class CardContent:
-    def __init__(self, color: str, number: int) -> None:
+    # There is only one instance for each color and number, created at import.
+    # CardContent(color, number) returns it, so contents are cheap to create
+    # and can be keys of sets and dicts. They are immutable.
+    __slots__ = ("color", "number", "code")
+
+    def __new__(cls, color: str, number: int) -> 'CardContent':
+        try:
+            return CONTENTS[(color, number)]
+        except (KeyError, TypeError):
+            pass
         if color not in COLORS:
             raise Exception(f"Invalid color: {color}")
+        raise Exception(f"Invalid number: {number}")
 
-        if number < MIN_NUMBER or number > MAX_NUMBER:
-            raise Exception(f"Invalid number: {number}")
-        self.color = color
-        self.number = number
+    @classmethod
+    def create(cls, color: str, number: int) -> 'CardContent':
+        # used only to fill CONTENTS
+        content = object.__new__(cls)
+        object.__setattr__(content, "color", color)
+        object.__setattr__(content, "number", number)
+        object.__setattr__(content, "code", encode(color=color, number=number))
+        return content
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("CardContent is immutable.")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError("CardContent is immutable.")
+
+    def __reduce__(self):
+        # unpickled to the interned instance
+        return CardContent, (self.color, self.number)
 
     def __eq__(self, __o: object) -> bool:
-        return __o.color == self.color and __o.number == self.number
+        if not isinstance(__o, CardContent):
+            return NotImplemented
+        return __o.code == self.code
+
+    def __hash__(self) -> int:
+        return self.code
 
     def __lt__(self, __o: object) -> bool:
-        if __o.number != self.number:
-            return self.number < __o.number
-        if self.color == 'B' and __o.color == 'W':
-            return True
-        return False
+        return self.code < __o.code
 
     def __repr__(self) -> str:
         return f"{self.color}{self.number:02}"
 
+    def to_code(self) -> int:
+        return self.code
+
+    @classmethod
+    def from_code(cls, code: int) -> 'CardContent':
+        try:
+            return CONTENTS_BY_CODE[code]
+        except KeyError:
+            raise Exception(f"Invalid code: {code}")
+
 
-class Card:
-    def __init__(self,
-                 color: str,
-                 number: int,
-                 opened: bool = True,
-                 owned_by: Optional[int] = None,
-                 card_id: Optional[int] = None):
-        self.__content = CardContent(color=color, number=number)
-        self.opened = opened
-        self.owned_by = owned_by
-        self.card_id = card_id
+CONTENTS: dict[Tuple[str, int], CardContent] = {
+    (color, number): CardContent.create(color=color, number=number)
+    for number in range(MIN_NUMBER, MAX_NUMBER + 1) for color in COLORS}
+CONTENTS_BY_CODE: dict[int, CardContent] = {
+    content.code: content for content in CONTENTS.values()}
+
+
+class Card(tuple):
+    # An immutable tuple of (content, opened, owned_by, card_id) like a namedtuple,
+    # compared and hashed by all of them. open and set_owner return new cards.
+    __slots__ = ()
+    __content = property(itemgetter(0))
+    opened = property(itemgetter(1))
+    owned_by = property(itemgetter(2))
+    card_id = property(itemgetter(3))
+
+    def __new__(cls,
+                color: str,
+                number: int,
+                opened: bool = True,
+                owned_by: Optional[int] = None,
+                card_id: Optional[int] = None) -> 'Card':
+        return tuple.__new__(cls, (CardContent(color=color, number=number), opened, owned_by, card_id))
+
+    def __replace(self, opened: bool, owned_by: Optional[int]) -> 'Card':
+        # copy without validating the content again
+        return tuple.__new__(Card, (self.__content, opened, owned_by, self.card_id))
+
+    def __getnewargs__(self):
+        return self.__content.color, self.__content.number, self.opened, self.owned_by, self.card_id
 
     def get_content(self, referred_by: Optional[int] = None) -> CardContent:
-        color = self.get_color()
-        number = self.get_number(referred_by=referred_by)
-        return CardContent(color=color, number=number)
+        self.check_visible(referred_by=referred_by)
+        return self.__content
+
+    def get_code(self, referred_by: Optional[int] = None) -> int:
+        self.check_visible(referred_by=referred_by)
+        return self.__content.code
 
     def get_color(self) -> str:
         return self.__content.color
 
     def get_number(self, referred_by: Optional[int] = None):
+        self.check_visible(referred_by=referred_by)
+        return self.__content.number
+
+    def check_visible(self, referred_by: Optional[int] = None) -> None:
         if (not self.opened) and (referred_by != self.owned_by):
             raise Exception(
                 f'The number is not available because the card is not opened and owned by Player{self.owned_by}, not Player{referred_by}.')
-        return self.__content.number
 
-    def get_content_id(self) -> str:
-        # TODO: make hash
+    def get_content_id(self) -> CardContent:
+        # hashable, and the same for the same contents
         return self.__content
 
     def set_owner(self, player_id: int) -> 'Card':
         if (self.owned_by is not None) and (self.owned_by != player_id):
             raise Exception(
                 f"The card is owned by {self.owned_by}. You can't change owner.")
-        return Card(color=self.__content.color, number=self.__content.number, opened=self.opened, owned_by=player_id, card_id=self.card_id)
+        return self.__replace(opened=self.opened, owned_by=player_id)
 
     def open(self) -> 'Card':
         if self.opened:
             raise Exception(f'The card is already opened: {self}')
-        return Card(color=self.__content.color, number=self.__content.number, opened=True, owned_by=self.owned_by, card_id=self.card_id)
-
-    def __eq__(self, __o: object) -> bool:
-        return (__o.__content == self.__content) and (__o.opened == self.opened) and (__o.owned_by == self.owned_by) and (__o.card_id == self.card_id)
+        return self.__replace(opened=True, owned_by=self.owned_by)
 
     def __lt__(self, __o: object) -> bool:
-        return self.__content < __o.__content
+        return self.__content.code < __o.__content.code
 
     def __repr__(self) -> str:
         if self.opened:
@@ -26,7 +26,7 @@ class CardList:
         return " ".join([card.debug() for card in self.cards])
 
     def is_unique(self) -> bool:
-        return len(set([str(card.get_content_id()) for card in self.cards])) == len(self.cards)
+        return len({card.get_content_id() for card in self.cards}) == len(self.cards)
 
 
 class SimulationHands(CardList):
@@ -50,11 +50,12 @@ class SimulationHands(CardList):
 
 
 class Deck(CardList):
-    def __init__(self, colors: list[str], numbers: list[int]):
-        cards = [Card(color=color, number=number, opened=False, card_id=i+j)
+    def __init__(self, colors: list[str], numbers: list[int], rng: Optional[random.Random] = None):
+        cards = [Card(color=color, number=number, opened=False, card_id=i*len(numbers)+j)
                  for i, color in enumerate(colors) for j, number in enumerate(numbers)]
         # shuffle
-        self.cards: list[Card] = random.sample(cards, len(cards))
+        rng = random if rng is None else rng
+        self.cards: list[Card] = rng.sample(cards, len(cards))
 
     def draw(self, player_id: int) -> Optional[Card]:
         if len(self.cards) == 0:
@@ -63,6 +64,14 @@ class Deck(CardList):
         card = card.set_owner(player_id=player_id)
         return card
 
+    def draw_order(self) -> list[int]:
+        # card ids in the order they are drawn
+        return [card.card_id for card in reversed(self.cards)]
+
+    def set_draw_order(self, card_ids: list[int]) -> None:
+        cards = {card.card_id: card for card in self.cards}
+        self.cards = [cards[card_id] for card_id in reversed(card_ids)]
+
 
 class Hands(CardList):
     def __init__(self, cards: list[Card]):
@@ -105,8 +114,14 @@ class Hands(CardList):
     def get_opened_cards(self) -> list[Tuple[int, CardContent]]:
         return [(position, card.get_content()) for position, card in enumerate(self.cards) if card.opened]
 
+    def get_opened_codes(self) -> list[Tuple[int, int]]:
+        return [(position, card.get_code()) for position, card in enumerate(self.cards) if card.opened]
+
     def get_contents(self, referred_by: int) -> list[CardContent]:
         return [card.get_content(referred_by=referred_by) for card in self.cards]
 
+    def get_codes(self, referred_by: int) -> list[int]:
+        return [card.get_code(referred_by=referred_by) for card in self.cards]
+
     def is_loser(self) -> bool:
         return all([card.opened for card in self.cards])
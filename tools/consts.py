@@ -5,3 +5,4 @@ NUMBERS = list(range(MIN_NUMBER, MAX_NUMBER+1))
 MAX_HANDS = 4
 MAX_TURNS = 100
 SLEEP_SECONDS = 3
+LOCAL_CANDIDATES_CACHE_SIZE = 4096
@@ -0,0 +1,250 @@
+from collections import defaultdict
+from typing import Any, Sequence, Tuple
+import numpy as np
+
+
+def count_ascending(slots: list[list[Any]]) -> Tuple[int, list[list[int]]]:
+    # Count the sequences which pick one item from each slot and are strictly
+    # ascending, without enumerating them.
+    # Items in each slot must be sorted in ascending order.
+    # Returns the total count and, for each item of each slot,
+    # the number of sequences that pick it.
+    if len(slots) == 0:
+        return 1, []
+
+    # forward[p][i]: number of ascending prefixes which end with slots[p][i]
+    forward: list[list[int]] = [[1] * len(slots[0])]
+    for p in range(1, len(slots)):
+        previous, previous_counts = slots[p-1], forward[p-1]
+        counts = []
+        running, j = 0, 0
+        for item in slots[p]:
+            while j < len(previous) and previous[j] < item:
+                running += previous_counts[j]
+                j += 1
+            counts.append(running)
+        forward.append(counts)
+
+    backward = count_suffixes(slots)
+
+    total = sum(forward[-1])
+    marginals = [[f * b for f, b in zip(forward[p], backward[p])]
+                 for p in range(len(slots))]
+    return total, marginals
+
+
+def batch_count_ascending(domains: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # count_ascending for many hands at once.
+    # domains[g, p, c] tells whether code c is a candidate at position p of hands g.
+    # Returns the totals (hands) and the marginals (hands x positions x codes)
+    # as floats, which are exact up to 2**53.
+    # Pad shorter hands with positions which have a single code above all codes.
+    domains = domains.astype(np.float64)
+    hands, positions, _ = domains.shape
+    if positions == 0:
+        return np.ones(hands), domains
+    forward = np.empty_like(domains)
+    forward[:, 0] = domains[:, 0]
+    for p in range(1, positions):
+        # prefixes which end with a smaller code
+        below = np.cumsum(forward[:, p-1], axis=1) - forward[:, p-1]
+        forward[:, p] = domains[:, p] * below
+    backward = np.empty_like(domains)
+    backward[:, -1] = domains[:, -1]
+    for p in range(positions - 2, -1, -1):
+        # suffixes which start with a larger code
+        above = np.cumsum(backward[:, p+1, ::-1], axis=1)[:, ::-1] - backward[:, p+1]
+        backward[:, p] = domains[:, p] * above
+    return forward[:, -1].sum(axis=1), forward * backward
+
+
+def count_suffixes(slots: list[list[Any]]) -> list[list[int]]:
+    # backward[p][i]: number of ascending suffixes which start with slots[p][i]
+    if len(slots) == 0:
+        return []
+    backward: list[list[int]] = [[] for _ in slots]
+    backward[-1] = [1] * len(slots[-1])
+    for p in range(len(slots) - 2, -1, -1):
+        following, following_counts = slots[p+1], backward[p+1]
+        counts = [0] * len(slots[p])
+        running, j = 0, len(following) - 1
+        for i in range(len(slots[p]) - 1, -1, -1):
+            while j >= 0 and slots[p][i] < following[j]:
+                running += following_counts[j]
+                j -= 1
+            counts[i] = running
+        backward[p] = counts
+    return backward
+
+
+def sample_ascending(slots: list[list[int]], size: int, rng=None) -> np.ndarray:
+    # Draw ascending sequences uniformly at random as a matrix (size x slots)
+    # like enumerate_candidate_matrix, without enumerating them.
+    # Each item is drawn in proportion to the number of suffixes starting with it
+    # among the items above the previous one, so every sequence has the same probability.
+    # rng is a np.random.Generator. The global random state is used by default.
+    rng = np.random if rng is None else rng
+    backward = count_suffixes(slots)
+    if len(slots) > 0 and sum(backward[0]) == 0:
+        return np.zeros((0, len(slots)), dtype=np.int16)
+    matrix = np.zeros((size, len(slots)), dtype=np.int16)
+    previous = np.full(size, -1)
+    for p, slot in enumerate(slots):
+        values = np.asarray(slot, dtype=np.int16)
+        # counts can exceed int64, but only their ratios matter
+        weights = np.asarray(backward[p], dtype=np.float64)[np.newaxis, :] * \
+            (previous[:, np.newaxis] < values[np.newaxis, :])
+        cumulative = np.cumsum(weights, axis=1)
+        draws = rng.random(size) * cumulative[:, -1]
+        columns = (cumulative <= draws[:, np.newaxis]).sum(axis=1)
+        matrix[:, p] = values[columns]
+        previous = matrix[:, p]
+    return matrix
+
+
+def narrow_slots(slots: list[Sequence[int]]) -> list[Tuple[int, ...]]:
+    # Drop items which are not in any ascending sequence.
+    # A forward pass raises the lower bound of each slot to be above the
+    # smallest item of the previous slot, and a backward pass lowers the upper
+    # bound to be below the largest item of the next slot. Both bounds count
+    # every card between a slot and its opened neighbors, and colors too
+    # because items are codes. Each remaining item is in some sequence.
+    # Items in each slot must be sorted in ascending order.
+    narrowed: list[Tuple[int, ...]] = []
+    previous = None
+    for slot in slots:
+        items = tuple(item for item in slot if previous is None or previous < item)
+        if len(items) == 0:
+            return [() for _ in slots]
+        previous = items[0]
+        narrowed.append(items)
+
+    following = None
+    for p in range(len(narrowed) - 1, -1, -1):
+        items = tuple(item for item in narrowed[p]
+                      if following is None or item < following)
+        if len(items) == 0:
+            return [() for _ in slots]
+        following = items[-1]
+        narrowed[p] = items
+    return narrowed
+
+
+def count_disjoint(hands: list[list[list[int]]]) -> Tuple[int, list[list[list[int]]]]:
+    # count_ascending for several hands at once, where no item is in two hands.
+    # Items are assigned in ascending order, either to the next position of one
+    # of the hands or to none of them. The state is the number of filled positions
+    # of each hands, so the cost grows with the product of their lengths instead
+    # of the product of their candidates.
+    # Counts are floats like batch_count_ascending, then rounded.
+    # Returns the total count and the marginals of each hands.
+    lengths = [len(slots) for slots in hands]
+    shape = tuple(length + 1 for length in lengths)
+    items = sorted({item for slots in hands for slot in slots for item in slot})
+    # members[h][item][p]: item is in slots p of hands h
+    members: list[dict[Any, np.ndarray]] = []
+    for slots in hands:
+        member: dict[Any, np.ndarray] = defaultdict(lambda: np.zeros(len(slots)))
+        for p, slot in enumerate(slots):
+            for item in slot:
+                member[item][p] = 1
+        members.append(dict(member))
+
+    def along(h: int, start: int, stop: int) -> Tuple[slice, ...]:
+        index = [slice(None)] * len(hands)
+        index[h] = slice(start, stop)
+        return tuple(index)
+
+    def expand(h: int, vector: np.ndarray) -> np.ndarray:
+        return vector.reshape([-1 if axis == h else 1 for axis in range(len(hands))])
+
+    # forward[i][state]: assignments of the items before items[i] which reach the state
+    forward = []
+    counts = np.zeros(shape)
+    counts[(0,) * len(hands)] = 1
+    for item in items:
+        forward.append(counts)
+        counts = counts.copy()
+        for h, member in enumerate(members):
+            if item in member:
+                counts[along(h, 1, shape[h])] += forward[-1][along(h, 0, lengths[h])] * \
+                    expand(h, member[item])
+    total = counts[tuple(lengths)]
+
+    # backward[i][state]: assignments of the items after items[i] which fill the hands from the state
+    backward = [np.zeros(shape) for _ in items]
+    counts = np.zeros(shape)
+    counts[tuple(lengths)] = 1
+    for i in range(len(items) - 1, -1, -1):
+        backward[i] = counts
+        counts = counts.copy()
+        for h, member in enumerate(members):
+            if items[i] in member:
+                counts[along(h, 0, lengths[h])] += backward[i][along(h, 1, shape[h])] * \
+                    expand(h, member[items[i]])
+
+    marginals = [[[0] * len(slot) for slot in slots] for slots in hands]
+    for h, (slots, member) in enumerate(zip(hands, members)):
+        columns = {item: i for i, item in enumerate(items) if item in member}
+        others = tuple(axis for axis in range(len(hands)) if axis != h)
+        for item, i in columns.items():
+            # the item is at position p when the state has p filled positions before it
+            through = (forward[i][along(h, 0, lengths[h])] *
+                       backward[i][along(h, 1, shape[h])]).sum(axis=others) * member[item]
+            for p, slot in enumerate(slots):
+                if through[p] > 0:
+                    marginals[h][p][slot.index(item)] = int(round(through[p]))
+    return int(round(total)), marginals
+
+
+def count_slots(slots_list: list[Tuple[int, list[int], list[list[int]]]]) -> Tuple[int, dict[Tuple[int, int], dict[int, int]]]:
+    # Count joint hands of opponents given as (opponent_id, closed positions, slots).
+    # Returns the total count and the counter of codes at each (opponent_id, position).
+    # Each hands is counted by itself, and several hands are coupled by count_disjoint
+    # because a card can't be in two hands.
+    if len(slots_list) > 1:
+        joint_total, marginals_list = count_disjoint(
+            [slots for _, _, slots in slots_list])
+        counter: dict[Tuple[int, int], dict[int, int]] = defaultdict(dict)
+        for (opponent_id, positions, slots), marginals in zip(slots_list, marginals_list):
+            for position in positions:
+                for code, count in zip(slots[position], marginals[position]):
+                    if count > 0:
+                        counter[(opponent_id, position)][code] = count
+        return joint_total, counter
+
+    counted: list[Tuple[int, list[int], list[list[int]], int, list[list[int]]]] = []
+    for opponent_id, positions, slots in slots_list:
+        total, marginals = count_ascending(slots)
+        counted.append((opponent_id, positions, slots, total, marginals))
+
+    joint_total = 1
+    for _, _, _, total, _ in counted:
+        joint_total *= total
+
+    counter: dict[Tuple[int, int], dict[int, int]] = defaultdict(dict)
+    if joint_total == 0:
+        return 0, counter
+    for opponent_id, positions, slots, total, marginals in counted:
+        others = joint_total // total
+        for position in positions:
+            for code, count in zip(slots[position], marginals[position]):
+                if count > 0:
+                    counter[(opponent_id, position)][code] = count * others
+    return joint_total, counter
+
+
+def enumerate_candidate_matrix(slots: list[list[int]]) -> np.ndarray:
+    # Enumerate the ascending sequences as a matrix (sequences x slots).
+    # Extend ascending prefixes one position at a time.
+    # np.nonzero scans row by row, so rows stay in lexicographic order.
+    matrix = np.zeros((1, 0), dtype=np.int16)
+    for slot in slots:
+        values = np.asarray(slot, dtype=np.int16)
+        if matrix.shape[1] == 0:
+            keep = np.ones((1, len(values)), dtype=bool)
+        else:
+            keep = matrix[:, -1:] < values[np.newaxis, :]
+        rows, columns = np.nonzero(keep)
+        matrix = np.column_stack([matrix[rows], values[columns]])
+    return matrix
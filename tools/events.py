@@ -0,0 +1,112 @@
+import json
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+from tools.attack import Attack
+from tools.card import Card
+from tools.utils import print_status
+
+
+def to_record(value: Any) -> Any:
+    # Make event fields JSON friendly and independent of later mutations.
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (Card, Attack)):
+        # They are tuples, but recorded as they are shown.
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [to_record(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): to_record(v) for k, v in value.items()}
+    if hasattr(value, "item"):
+        # NumPy scalars
+        return value.item()
+    return str(value)
+
+
+class EventSink(ABC):
+    @abstractmethod
+    def emit(self, event: str, **fields: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class NullSink(EventSink):
+    # Drop all events. Use it for headless bulk runs.
+    def emit(self, event: str, **fields: Any) -> None:
+        pass
+
+
+class ListSink(EventSink):
+    def __init__(self):
+        self.events: list[dict[str, Any]] = []
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {key: to_record(value) for key, value in fields.items()}
+        record["event"] = event
+        self.events.append(record)
+
+
+class JsonlSink(EventSink):
+    def __init__(self, path: str):
+        self.file = open(path, "a")
+
+    def emit(self, event: str, **fields: Any) -> None:
+        record = {key: to_record(value) for key, value in fields.items()}
+        record["event"] = event
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> 'JsonlSink':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def search_prefix(fields: dict[str, Any]) -> str:
+    return "> " * fields["depth"]
+
+
+CONSOLE_FORMATS: dict[str, Callable[[dict[str, Any]], str]] = {
+    # game
+    "turn": lambda f: f"Turn{f['turn']} Attacker: {f['attacker']}",
+    "deck_empty": lambda f: "deck is empty.",
+    "skip": lambda f: "Skip the next attack.",
+    "attack": lambda f: f"Attack: {f['attack']}",
+    "judging": lambda f: "Judging...",
+    "success": lambda f: "Success!\n",
+    "failure": lambda f: "Failed.",
+    "game_over": lambda f: f"The game is over! Winner: {f['winner_name']}",
+    "timeout": lambda f: f"The game is over without a winner in {f['turns']} turns.",
+    "insert": lambda f: f"Inserted: {f['card']}",
+    "turn_end": lambda f: "\n",
+    # logics
+    "hand_candidates": lambda f: f"Hand candidates: {f['count']}",
+    "hand_samples": lambda f: f"Hand candidates are sampled: {f['count']}",
+    "attack_candidates_overall": lambda f: f"Attack candidates (Overall): {f['count']}",
+    "maximize_probability": lambda f: "Maxmize probability.",
+    "probability": lambda f: f"Probability: {f['proba']:.2f}",
+    "maximize_entropy": lambda f: "Maximize entropy.",
+    "entropy": lambda f: f"Entropy: {f['entropy']:.2f}",
+    "attack_candidates": lambda f: f"Attack candidates: {f['count']}",
+    "success_probability": lambda f: f"Probability of Success: {int(f['proba']*100):.1f}%",
+    # recursion of maximize_entropy
+    "search_max_depth": lambda f: search_prefix(f) + "Recursion reached max_depth.",
+    "search_skip": lambda f: search_prefix(f) + "Skip",
+    "search_attack": lambda f: search_prefix(f) + f"{f['attack']}, {f['proba']}",
+    "search_result": lambda f: search_prefix(f) + f"{f['attacks']} {f['gain']} (depth={f['depth']})",
+}
+
+
+class ConsoleSink(EventSink):
+    # Print events in the same way as the interactive game.
+    def emit(self, event: str, **fields: Any) -> None:
+        if event == "status":
+            print_status(fields["players"])
+            return
+        if event in CONSOLE_FORMATS:
+            print(CONSOLE_FORMATS[event](fields))
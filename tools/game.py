@@ -1,48 +1,122 @@
-from typing import Optional, Any
-import time
+from typing import Optional, Any, Generator, Tuple
 from tools.card import CardContent
 from tools.card_list import Deck, Hands
 from tools.player import Player
 from tools.logic import LogicBase
-from tools.utils import print_status
-from tools.consts import COLORS, NUMBERS, MAX_HANDS, MAX_TURNS, SLEEP_SECONDS
+from tools.events import EventSink, ConsoleSink
+from tools.pacer import Pacer, NoPacer
+from tools.profiler import Profiler, NullProfiler, aggregate_profiles
+from tools.rng import spawn_streams
+import random
+from tools.consts import COLORS, NUMBERS, MIN_NUMBER, MAX_NUMBER, MAX_HANDS, MAX_TURNS
 
 
 class Game:
     def __init__(self, logics: list[LogicBase], colors: list[str] = COLORS,
                  numbers: list[int] = NUMBERS, max_turns: int = MAX_TURNS,
                  max_hands: int = MAX_HANDS,
-                 sleep_seconds: int = SLEEP_SECONDS):
+                 sink: Optional[EventSink] = None,
+                 pacer: Optional[Pacer] = None,
+                 profile: bool = False,
+                 seed: Optional[int] = None):
+        # Cards and the solver are limited to the colors and numbers of tools/consts.py.
+        # Raise MAX_NUMBER there for larger decks.
+        if any(color not in COLORS for color in colors):
+            raise Exception(f"Invalid colors: {colors}. Colors should be in {COLORS}.")
+        if any(number < MIN_NUMBER or number > MAX_NUMBER for number in numbers):
+            raise Exception(
+                f"Invalid numbers: {numbers}. Numbers should be from {MIN_NUMBER} to {MAX_NUMBER} (MAX_NUMBER in tools/consts.py).")
         self.logics = logics
         self.colors = colors
         self.numbers = numbers
         self.max_turns = max_turns
         self.max_hands = max_hands
-        self.sleep_seconds = sleep_seconds
+        self.pacer = NoPacer() if pacer is None else pacer
+        self.sink = ConsoleSink() if sink is None else sink
+        # profiles of acts are added to outputs
+        self.profile = profile
+        # The deck and each logic get their own random stream derived from seed.
+        # Without seed, the global random states are used.
+        self.seed = seed
+        # outputs of the last game. start returns None on a timeout,
+        # but its outputs (winner is None) are kept here.
+        self.outputs: Optional[dict[str, Any]] = None
 
     def start(self) -> Optional[dict[str, Any]]:
+        driver = StepDriver(self.steps())
+        for request, payload in driver:
+            if request == "act":
+                logic, arguments = payload
+                driver.respond(logic.act(**arguments))
+            else:
+                driver.respond(self.pacer.pace())
+        return driver.outputs
+
+    async def start_async(self) -> Optional[dict[str, Any]]:
+        # Same as start, but acting and pacing don't block other coroutines.
+        driver = StepDriver(self.steps())
+        for request, payload in driver:
+            if request == "act":
+                logic, arguments = payload
+                driver.respond(await logic.act_async(**arguments))
+            else:
+                driver.respond(await self.pacer.pace_async())
+        return driver.outputs
+
+    def steps(self) -> Generator[Tuple[str, Any], Any, Optional[dict[str, Any]]]:
+        # The game loop. It doesn't call logics or wait by itself:
+        # it yields ("act", (logic, arguments)) to get an attack and meta,
+        # and ("pace", None) before judging an attack.
         history = []
         opened_cards = []
         losers = 0
         attacker_id = 0
 
-        deck = Deck(colors=self.colors, numbers=self.numbers)
+        sink = self.sink
+        for logic in self.logics:
+            logic.sink = sink
+            # Reset profilers of logics reused from profiled games.
+            logic.profiler = Profiler() if self.profile else NullProfiler()
+
+        if self.seed is None:
+            deck_rng = None
+            for logic in self.logics:
+                # The class defaults are the global states. The random module
+                # on an instance can't be pickled or copied.
+                vars(logic).pop("rng", None)
+                vars(logic).pop("np_rng", None)
+        else:
+            (deck_rng, _), *streams = spawn_streams(
+                seed=self.seed, n=len(self.logics) + 1)
+            for logic, (rng, np_rng) in zip(self.logics, streams):
+                logic.rng, logic.np_rng = rng, np_rng
+
+        deck = self.create_deck(rng=deck_rng)
+        sink.emit("game_start", players=len(self.logics), colors=self.colors, numbers=self.numbers,
+                  max_hands=self.max_hands, max_turns=self.max_turns, seed=self.seed,
+                  deck=deck.draw_order())
         players = self.init_players(deck=deck)
 
         outputs = {"proba_list": [],
-                   "attack_results": [], "skip_count": [0, 0]}
+                   "attack_results": [], "skip_count": [0] * len(self.logics)}
+        self.outputs = outputs
+        if self.profile:
+            outputs["profiles"] = []
+        if self.seed is not None:
+            outputs["seed"] = self.seed
 
         for turn in range(1, self.max_turns + 1):
-            print_status(players)
+            sink.emit("status", players=players)
             attacker = players[attacker_id]
-            print(f"Turn{turn} Attacker: {attacker.name}")
+            sink.emit("turn", turn=turn, attacker=attacker.name,
+                      attacker_id=attacker.player_id)
             opponents = [
                 player for player in players if player.player_id != attacker.player_id]
 
             new_card = deck.draw(player_id=attacker.player_id)
             new_card_content: Optional[CardContent] = None
             if new_card is None:
-                print("deck is empty.")
+                sink.emit("deck_empty")
             else:
                 new_card_content = new_card.get_content(
                     referred_by=attacker.player_id)
@@ -51,59 +125,78 @@ class Game:
 
             while True:
                 logic = self.logics[attacker_id]
-                attack, meta = logic.act(player=attacker, opponents=opponents,
-                                         new_card=new_card_content, has_succeeded=has_succeeded,
-                                         opened_cards=opened_cards, history=history)
+                attack, meta = yield "act", (logic, dict(player=attacker, opponents=opponents,
+                                                         new_card=new_card_content, has_succeeded=has_succeeded,
+                                                         opened_cards=opened_cards, history=history))
+                if self.profile and meta is not None and "profile" in meta:
+                    outputs["profiles"].append(dict(turn=turn, player_id=attacker.player_id,
+                                                    **meta["profile"]))
 
                 if attack is None:
                     if not has_succeeded:
                         raise Exception(
                             "You can't skip your next attack because your attack has not succeeded yet.")
-                    print("Skip the next attack.")
+                    sink.emit("skip", player_id=attacker.player_id)
                     outputs["skip_count"][attacker.player_id] += 1
                     break
 
-                print(f"Attack: {attack}")
+                sink.emit("attack", attack=attack, proba=meta.get("proba"))
                 # Apply attack
                 history.append(attack)
                 outputs["proba_list"].append(meta.get("proba"))
                 attacked_player = players[attack.attacked_to]
-                print("Judging...")
-                time.sleep(self.sleep_seconds)
+                sink.emit("judging")
+                yield "pace", None
                 result = attacked_player.judge(attack=attack)
                 outputs["attack_results"].append(result)
                 if result:
-                    print("Success!\n")
+                    sink.emit("success")
                     has_succeeded = True
                     opened_card: CardContent = attacked_player.open(
                         position=attack.position)
                     opened_cards.append(opened_card)
-                    print_status(players=players)
+                    sink.emit("status", players=players)
                     # Judge whether the game is over or not
                     if attacked_player.is_loser():
                         losers += 1
                         if losers == len(self.logics)-1:
-                            print(
-                                f"The game is over! Winner: {attacker.name}")
-                            outputs["history"] = history
-                            outputs["winner"] = attacker.player_id
-                            outputs["turns"] = turn
+                            sink.emit("game_over", winner=attacker.player_id,
+                                      winner_name=attacker.name, turns=turn)
+                            self.finish(outputs=outputs, history=history, players=players,
+                                        winner=attacker.player_id, turns=turn)
                             return outputs
                 else:
-                    print("Failed.")
+                    sink.emit("failure")
                     if new_card is not None:
                         new_card = new_card.open()
                     break
 
             if new_card is not None:
-                attacker.insert(new_card)
-                print(f"Inserted: {new_card}")
+                position = attacker.insert(new_card)
+                sink.emit("insert", card=new_card,
+                          player_id=attacker.player_id, position=position)
 
             # switch attacker
             attacker_id = self.get_next_attacker(attacker_id)
-            print("\n")
+            sink.emit("turn_end")
+        sink.emit("timeout", turns=self.max_turns)
+        self.finish(outputs=outputs, history=history, players=players,
+                    winner=None, turns=self.max_turns)
         return
 
+    def finish(self, outputs: dict[str, Any], history: list, players: list[Player],
+               winner: Optional[int], turns: int) -> None:
+        outputs["history"] = history
+        outputs["winner"] = winner
+        outputs["turns"] = turns
+        if self.profile:
+            outputs["profile"] = {player.player_id: aggregate_profiles(
+                [profile for profile in outputs["profiles"] if profile["player_id"] == player.player_id])
+                for player in players}
+
+    def create_deck(self, rng: Optional[random.Random]) -> Deck:
+        return Deck(colors=self.colors, numbers=self.numbers, rng=rng)
+
     def get_next_attacker(self, attacker_id) -> int:
         return (attacker_id+1) % len(self.logics)
 
@@ -122,3 +215,25 @@ class Game:
                 deck=deck, player_id=player_id, name=name)
             players.append(player)
         return players
+
+
+class StepDriver:
+    # Iterate the requests of Game.steps. The response to each request is sent
+    # back by respond, and the return value of steps is kept in outputs.
+    def __init__(self, steps: Generator[Tuple[str, Any], Any, Optional[dict[str, Any]]]):
+        self.steps = steps
+        self.response: Any = None
+        self.outputs: Optional[dict[str, Any]] = None
+
+    def respond(self, response: Any) -> None:
+        self.response = response
+
+    def __iter__(self):
+        while True:
+            try:
+                request = self.steps.send(self.response)
+            except StopIteration as stop:
+                self.outputs = stop.value
+                return
+            self.response = None
+            yield request
@@ -0,0 +1,149 @@
+import json
+from typing import Any, Iterator, Optional, Tuple
+from tools.attack import Attack
+from tools.card import decode
+from tools.card_list import Deck
+from tools.events import EventSink, NullSink
+from tools.game import Game, StepDriver
+from tools.logic import LogicBase
+from tools.player import Player
+
+
+class GameLogSink(EventSink):
+    # Write a JSON line for each game: the deck in drawing order and every
+    # attack, skip and insertion, enough to replay the game without its logics.
+    # Lines are written at the end of games by single appends, so workers of
+    # a tournament can share the file, and a sink can be copied to them.
+    def __init__(self, path: str):
+        self.path = path
+        self.log: Optional[dict[str, Any]] = None
+        self.turn = 0
+        self.attack: Optional[dict[str, Any]] = None
+
+    def emit(self, event: str, **fields: Any) -> None:
+        if event == "game_start":
+            self.log = {**fields, "actions": [],
+                        "winner": None, "turns": None}
+        if self.log is None:
+            return
+        actions = self.log["actions"]
+        if event == "turn":
+            self.turn = fields["turn"]
+        elif event == "attack":
+            attack: Attack = fields["attack"]
+            self.attack = {"type": "attack", "turn": self.turn, "player_id": attack.attacked_by,
+                           "attacked_to": attack.attacked_to, "position": attack.position,
+                           "card_id": attack.card_id, "code": attack.card_content.to_code(),
+                           "proba": fields.get("proba")}
+            actions.append(self.attack)
+        elif event in ("success", "failure"):
+            self.attack["result"] = event == "success"
+        elif event == "skip":
+            actions.append({"type": "skip", "turn": self.turn,
+                            "player_id": fields["player_id"]})
+        elif event == "insert":
+            card = fields["card"]
+            actions.append({"type": "insert", "turn": self.turn, "player_id": fields["player_id"],
+                            "position": fields["position"], "card_id": card.card_id,
+                            "code": card.get_code(referred_by=fields["player_id"]), "opened": card.opened})
+        elif event in ("game_over", "timeout"):
+            self.log["winner"] = fields.get("winner")
+            self.log["turns"] = fields["turns"]
+            with open(self.path, "a") as file:
+                file.write(json.dumps(self.log, separators=(",", ":")) + "\n")
+            self.log = None
+
+
+def read_game_logs(path: str) -> Iterator[dict[str, Any]]:
+    # one game at a time
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def to_response(action: dict[str, Any]) -> Tuple[Optional[Attack], Optional[dict[str, Any]]]:
+    # what LogicBase.act returned for a recorded action
+    if action["type"] == "skip":
+        return None, None
+    color, number = decode(action["code"])
+    attack = Attack(card_id=action["card_id"], position=action["position"], color=color, number=number,
+                    attacked_to=action["attacked_to"], attacked_by=action["player_id"])
+    return attack, {"proba": action["proba"]}
+
+
+class ReplayLogic(LogicBase):
+    # Act as recorded. Used to fill the seats of a replayed game.
+    def __init__(self, actions: list[dict[str, Any]], name: Optional[str] = None):
+        self.actions = iter(actions)
+        self.name = "replay" if name is None else name
+
+    def act(self, player: Player, opponents, new_card, opened_cards, history, has_succeeded):
+        return to_response(next(self.actions))
+
+
+class ReplayGame(Game):
+    # Game with the deck of a log.
+    def __init__(self, log: dict[str, Any], **options):
+        decisions = [action for action in log["actions"]
+                     if action["type"] != "insert"]
+        logics = [ReplayLogic([action for action in decisions if action["player_id"] == player_id])
+                  for player_id in range(log["players"])]
+        super().__init__(logics=logics, colors=log["colors"], numbers=log["numbers"],
+                         max_turns=log["max_turns"], max_hands=log["max_hands"], **options)
+        self.draw_order = log["deck"]
+
+    def create_deck(self, rng) -> Deck:
+        deck = super().create_deck(rng=rng)
+        deck.set_draw_order(self.draw_order)
+        return deck
+
+
+class Replay:
+    # Reconstruct the states of a logged game by applying the recorded actions
+    # with the rules of Game, without running the logics.
+    def __init__(self, log: dict[str, Any]):
+        self.log = log
+
+    def decisions(self) -> Iterator[Tuple[dict[str, Any], dict[str, Any]]]:
+        # Recorded action and the arguments of LogicBase.act of each decision in order.
+        # The arguments are updated by the following actions, so copy them to keep them.
+        driver = StepDriver(ReplayGame(self.log, sink=NullSink()).steps())
+        actions = iter([action for action in self.log["actions"]
+                       if action["type"] != "insert"])
+        for request, payload in driver:
+            if request == "act":
+                _, arguments = payload
+                action = next(actions)
+                yield action, arguments
+                driver.respond(to_response(action))
+
+    def decision(self, index: int) -> dict[str, Any]:
+        # arguments of LogicBase.act of the index-th decision (0-origin)
+        for i, (_, arguments) in enumerate(self.decisions()):
+            if i == index:
+                return copy_arguments(arguments)
+        raise IndexError(f"The game has no decision {index}.")
+
+    def turn(self, turn: int) -> dict[str, Any]:
+        # arguments of the first decision of the turn
+        for action, arguments in self.decisions():
+            if action["turn"] == turn:
+                return copy_arguments(arguments)
+        raise IndexError(f"The game has no turn {turn}.")
+
+    def run(self, **options) -> Optional[dict[str, Any]]:
+        # Play the whole game again. outputs are the same as the original ones.
+        options.setdefault("sink", NullSink())
+        return ReplayGame(self.log, **options).start()
+
+
+def copy_arguments(arguments: dict[str, Any]) -> dict[str, Any]:
+    # Hands are replaced rather than mutated, so shallow copies of players are enough.
+    players = {player.player_id: Player(player_id=player.player_id, hands=player.hands, name=player.name)
+               for player in [arguments["player"]] + arguments["opponents"]}
+    return dict(player=players[arguments["player"].player_id],
+                opponents=[players[opponent.player_id]
+                           for opponent in arguments["opponents"]],
+                new_card=arguments["new_card"], opened_cards=list(arguments["opened_cards"]),
+                history=list(arguments["history"]), has_succeeded=arguments["has_succeeded"])
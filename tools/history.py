@@ -0,0 +1,46 @@
+from collections import OrderedDict, defaultdict
+from typing import Optional
+from tools.attack import Attack
+
+# number of histories (i.e. games) whose index is kept
+HISTORY_INDEX_CACHE_SIZE = 8
+
+
+class HistoryIndex:
+    # Tried codes of each card as a bitmask, indexed by card_id.
+    # History only grows during a game, so the index catches up with
+    # new attacks instead of scanning the whole history again.
+    def __init__(self, history: list[Attack]):
+        self.history = history
+        self.indexed = 0
+        self.tried: dict[Optional[int], int] = defaultdict(int)
+        self.sync()
+
+    def sync(self) -> None:
+        for attack in self.history[self.indexed:]:
+            self.tried[attack.card_id] |= 1 << attack.card_content.to_code()
+        self.indexed = len(self.history)
+
+    def tried_mask(self, card_id: Optional[int]) -> int:
+        return self.tried.get(card_id, 0)
+
+    def tried_cards(self, card_id: Optional[int]) -> set[int]:
+        mask = self.tried_mask(card_id)
+        return {code for code in range(mask.bit_length()) if (mask >> code) & 1}
+
+
+_indexes: OrderedDict[int, HistoryIndex] = OrderedDict()
+
+
+def index_history(history: list[Attack]) -> HistoryIndex:
+    key = id(history)
+    index = _indexes.get(key)
+    if index is None or index.history is not history or len(history) < index.indexed:
+        index = HistoryIndex(history)
+        _indexes[key] = index
+        if len(_indexes) > HISTORY_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    else:
+        index.sync()
+        _indexes.move_to_end(key)
+    return index
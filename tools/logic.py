@@ -1,18 +1,35 @@
-import itertools
 from tools.player import Player
-from tools.card import CardContent, Card
+from tools.card import CardContent, encode, decode, to_mask
 from tools.attack import Attack
-from tools.card_list import SimulationHands, Hands
 import random
+import time
 from collections import defaultdict
-from tools.consts import NUMBERS
-from typing import Optional, Tuple, Any
+from tools.consts import NUMBERS, LOCAL_CANDIDATES_CACHE_SIZE
+from tools.history import index_history
+from functools import lru_cache
+from tools.counting import count_slots, enumerate_candidate_matrix, narrow_slots
+from typing import Callable, Optional, Sequence, Tuple, Any
 import numpy as np
-import copy
 from abc import ABC, abstractmethod
+from tools.events import EventSink, ConsoleSink, NullSink
+from tools.belief import BeliefTracker
+from tools.transposition import TranspositionTable, fingerprint
+from tools.simulation import SimulationPlayer, UndoableHands, as_simulation_player
+from tools.profiler import Profiler, NullProfiler
+from tools.opening_book import OpeningBook
+from tools.solver_cache import SolverCache, decode_counter, encode_counter, situation_key
 
 
 class LogicBase(ABC):
+    # Game replaces it with its own sink.
+    sink: EventSink = ConsoleSink()
+    # Set a Profiler to get profiles of act in meta["profile"].
+    profiler: Profiler = NullProfiler()
+    # Game replaces them with streams derived from its seed.
+    # The global random states are used by default.
+    rng: random.Random = random
+    np_rng: Optional[np.random.Generator] = None
+
     @abstractmethod
     def act(self, player: Player,
             opponents: list[Player],
@@ -22,11 +39,20 @@ class LogicBase(ABC):
             has_succeeded: bool) -> Tuple[Optional[Attack], Optional[dict[str, Any]]]:
         pass
 
+    async def act_async(self, **arguments) -> Tuple[Optional[Attack], Optional[dict[str, Any]]]:
+        # Used by Game.start_async. Override it to wait for clients or workers
+        # without blocking other games on the event loop.
+        return self.act(**arguments)
+
 
 class EpsilonGreedy(LogicBase):
-    def __init__(self, epsilon: float = 0, name: Optional[str] = None):
+    def __init__(self, epsilon: float = 0, name: Optional[str] = None,
+                 opening_book: Optional[OpeningBook] = None, solver_cache: Optional[SolverCache] = None):
         self.epsilon = epsilon
         self.name = f"e_greedy(e={epsilon})" if name is None else name
+        self.tracker = BeliefTracker(track_hands=False)
+        self.opening_book = opening_book
+        self.solver_cache = solver_cache
 
     def act(self, player: Player,
             opponents: list[Player],
@@ -35,42 +61,80 @@ class EpsilonGreedy(LogicBase):
             history: list[Attack],
             has_succeeded: bool):
         if has_succeeded:
-            if random.random() <= self.epsilon:
+            if self.rng.random() <= self.epsilon:
                 # skip the next attack
                 return None, None
         meta = {}
-        # enumerate hands candidates for opponents
-        candidate_hands_list: list[list[SimulationHands]] = calculate_hand_candidates(
-            player=player, opened_cards=opened_cards, new_card=new_card,
-            opponents=opponents, history=history)
-
-        print(f"Hand candidates: {len(candidate_hands_list)}")
-
-        attacks_with_proba = transform_candidates_from_hand_to_attack(
-            candidate_hands_list=candidate_hands_list, opponents=opponents, player=player)
-
-        print(f"Attack candidates (Overall): {len(attacks_with_proba)}")
-
-        print("Maxmize probability.")
+        profiler = self.profiler
+        profiler.reset()
+        # count hands candidates for opponents
+        with profiler.phase("opening_book"):
+            opening = lookup_opening(opening_book=self.opening_book, player=player, opponents=opponents,
+                                     opened_cards=opened_cards, new_card=new_card, history=history)
+        cached = None
+        if opening is None and self.solver_cache is not None:
+            with profiler.phase("solver_cache"):
+                key = situation_key(player=player, opened_cards=opened_cards, new_card=new_card,
+                                    opponents=opponents, history=history)
+                cached = self.solver_cache.get(key)
+        if opening is not None:
+            candidates_num, counter = opening
+            meta["opening_book"] = True
+        elif cached is not None:
+            candidates_num, counter = decode_counter(cached, opponents=opponents)
+            meta["solver_cache"] = True
+        else:
+            with profiler.phase("update"):
+                self.tracker.update(player=player, opponents=opponents, opened_cards=opened_cards,
+                                    new_card=new_card, history=history)
+            with profiler.phase("count"):
+                candidates_num, counter = self.tracker.count()
+            if self.solver_cache is not None:
+                with profiler.phase("solver_cache"):
+                    self.solver_cache.put(key, encode_counter(
+                        candidates_num, counter, opponents=opponents))
+        with profiler.phase("get_attacks_with_proba"):
+            attacks_with_proba = get_attacks_with_proba(
+                counter=counter, opponents=opponents, player=player)
+        profiler.count("candidates", candidates_num)
+        profiler.count("attacks", len(attacks_with_proba))
+
+        self.sink.emit("hand_candidates", count=candidates_num)
+
+        self.sink.emit("attack_candidates_overall",
+                       count=len(attacks_with_proba))
+
+        self.sink.emit("maximize_probability")
         attack_candidates, proba = maximaize_probability(
             attack_candidates=attacks_with_proba)
-        print(f"Probability: {proba:.2f}")
+        self.sink.emit("probability", proba=proba)
         # choose attacks to maxmize success probability
-        print(f"Attack candidates: {len(attack_candidates)}")
+        self.sink.emit("attack_candidates", count=len(attack_candidates))
         # sample an attack.
-        chosen_attack, chosen_proba = random.choice(attack_candidates)
+        chosen_attack, chosen_proba = self.rng.choice(attack_candidates)
 
-        print(f"Probability of Success: {int(chosen_proba*100):.1f}%")
+        self.sink.emit("success_probability", proba=chosen_proba)
         meta["proba"] = chosen_proba
+        if profiler.enabled:
+            meta["profile"] = profiler.result()
         return chosen_attack, meta
 
 
 class MaxEntropy(LogicBase):
     def __init__(self,  top_proba_attacks: int = 3, max_samples: int = 1,
-                 name: Optional[str] = None):
+                 name: Optional[str] = None, transposition_size: int = 10000, max_depth: int = 3,
+                 max_candidates: int = 100000, hand_samples: int = 1000,
+                 opening_book: Optional[OpeningBook] = None):
         self.top_proba_attacks = top_proba_attacks
         self.max_samples = max_samples
+        self.max_depth = max_depth
         self.name = "max_entropy" if name is None else name
+        # hands of an opponent with more candidates than max_candidates are sampled
+        self.hand_samples = hand_samples
+        self.tracker = BeliefTracker(max_rows=max_candidates)
+        # search results for the current move
+        self.table = TranspositionTable(max_size=transposition_size)
+        self.opening_book = opening_book
 
     def act(self, player: Player,
             opponents: list[Player],
@@ -79,49 +143,183 @@ class MaxEntropy(LogicBase):
             history: list[Attack],
             has_succeeded: bool):
         meta = {}
-        # enumerate hands candidates for opponents
-        candidate_hands_list: list[list[SimulationHands]] = calculate_hand_candidates(
-            player=player, opened_cards=opened_cards, new_card=new_card,
-            opponents=opponents, history=history)
+        profiler = self.profiler
+        profiler.reset()
+        with profiler.phase("opening_book"):
+            opening = lookup_opening(opening_book=self.opening_book, player=player, opponents=opponents,
+                                     opened_cards=opened_cards, new_card=new_card, history=history)
+        # probabilities from counts are exact even if hands are sampled
+        counter = None
+        # not built when the book answers
+        candidate_matrices: Optional[dict[int, np.ndarray]] = None
+        sampled: list[int] = []
+        if opening is not None:
+            candidates_num, counter = opening
+            meta["opening_book"] = True
+        else:
+            candidate_matrices, sampled = self.build_matrices(
+                player=player, opponents=opponents, opened_cards=opened_cards, new_card=new_card, history=history)
+            if len(candidate_matrices) > 1 or len(sampled) > 0:
+                # A card can't be in the hands of two opponents, but the matrices are independent.
+                # Sampled matrices are only for the search.
+                with profiler.phase("count"):
+                    candidates_num, counter = self.tracker.count()
+            else:
+                candidates_num = count_candidate_matrices(candidate_matrices)
+        profiler.count("candidates", candidates_num)
 
-        print(f"Hand candidates: {len(candidate_hands_list)}")
+        self.sink.emit("hand_candidates", count=candidates_num)
+        if len(sampled) > 0:
+            self.sink.emit("hand_samples", count=self.hand_samples)
 
-        attacks_with_proba = transform_candidates_from_hand_to_attack(
-            candidate_hands_list=candidate_hands_list, opponents=opponents, player=player)
+        if counter is not None:
+            attacks_with_proba = get_attacks_with_proba(
+                counter=counter, opponents=opponents, player=player)
+        else:
+            with profiler.phase("transform_matrices_to_attack"):
+                attacks_with_proba = transform_matrices_to_attack(
+                    candidate_matrices=candidate_matrices, opponents=opponents, player=player)
+        profiler.count("attacks", len(attacks_with_proba))
 
-        print(f"Attack candidates (Overall): {len(attacks_with_proba)}")
+        self.sink.emit("attack_candidates_overall",
+                       count=len(attacks_with_proba))
 
         attacks_proba_1 = [(attack, proba)
                            for attack, proba in attacks_with_proba if proba == 1]
         if len(attacks_proba_1) == len(attacks_with_proba):
             attack_candidates = attacks_with_proba
+        elif opening is not None:
+            # Nothing is known about the opponent's hands but colors at the opening,
+            # so the search is skipped and the most probable attacks are chosen.
+            attack_candidates, _ = maximaize_probability(attacks_with_proba)
         else:
-            print("Maximize entropy.")
-            # Select attacks with high probability
-            # TODO: consider more wise selection of candidates
-            attacks_with_proba = select_attacks_with_high_proba(
-                attacks_with_proba=attacks_with_proba, phase1_max_num=self.top_proba_attacks)
-            # if you can skip, add skip option to candidates.
-            if has_succeeded:
-                attacks_with_proba.append((None, 1))
-
-            attack_candidates, entropy = maximize_entropy(attacks_with_proba=attacks_with_proba,
-                                                          candidate_hands_list=candidate_hands_list, opponents=opponents,
-                                                          player=player, opened_cards=opened_cards,
-                                                          new_card=new_card, history=history,
-                                                          phase1_max_num=self.top_proba_attacks, max_samples=self.max_samples)
-            print(f"Entropy: {entropy:.2f}")
+            self.sink.emit("maximize_entropy")
+            # cached values depend on the player and the history of this move
+            self.table.reset()
+            try:
+                with profiler.phase("search"):
+                    attack_candidates, entropy = self.search(attacks_with_proba=attacks_with_proba,
+                                                             candidate_matrices=candidate_matrices, opponents=opponents,
+                                                             player=player, opened_cards=opened_cards, new_card=new_card,
+                                                             history=history, has_succeeded=has_succeeded, meta=meta)
+                meta["transposition"] = self.table.stats()
+            finally:
+                # Entries are useless after the move, and copies of the logic would carry them.
+                self.table.reset()
+            self.sink.emit("entropy", entropy=entropy)
 
         # choose attacks to maxmize success probability
-        print(f"Attack candidates: {len(attack_candidates)}")
+        self.sink.emit("attack_candidates", count=len(attack_candidates))
 
         # sample an attack.
-        chosen_attack, chosen_proba = random.choice(attack_candidates)
+        chosen_attack, chosen_proba = self.rng.choice(attack_candidates)
         if chosen_proba is not None:
-            print(f"Probability of Success: {int(chosen_proba*100):.1f}%")
+            self.sink.emit("success_probability", proba=chosen_proba)
             meta["proba"] = chosen_proba
+        if profiler.enabled:
+            meta["profile"] = profiler.result()
         return chosen_attack, meta
 
+    def build_matrices(self, player: Player, opponents: list[Player], opened_cards: list[CardContent],
+                       new_card: Optional[CardContent], history: list[Attack]) -> Tuple[dict[int, np.ndarray], list[int]]:
+        # hand candidates of each opponent, and the opponents whose hands are sampled
+        profiler = self.profiler
+        with profiler.phase("update"):
+            self.tracker.update(player=player, opponents=opponents, opened_cards=opened_cards,
+                                new_card=new_card, history=history)
+        with profiler.phase("candidate_matrices"):
+            candidate_matrices: dict[int, np.ndarray] = self.tracker.candidate_matrices(
+                samples=self.hand_samples, rng=self.np_rng)
+        return candidate_matrices, self.tracker.sampled_opponents()
+
+    def search(self, attacks_with_proba: list[Tuple[Attack, float]], candidate_matrices: dict[int, np.ndarray],
+               opponents: list[Player], player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+               history: list[Attack], has_succeeded: bool, meta: dict[str, Any]) -> Tuple[list[Tuple[Attack, float]], float]:
+        return self.search_with(attacks_with_proba=attacks_with_proba, candidate_matrices=candidate_matrices,
+                                opponents=opponents, player=player, opened_cards=opened_cards, new_card=new_card,
+                                history=history, has_succeeded=has_succeeded, max_depth=self.max_depth,
+                                top_proba_attacks=self.top_proba_attacks, max_samples=self.max_samples)
+
+    def search_with(self, attacks_with_proba: list[Tuple[Attack, float]], candidate_matrices: dict[int, np.ndarray],
+                    opponents: list[Player], player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+                    history: list[Attack], has_succeeded: bool, max_depth: int, top_proba_attacks: int, max_samples: int,
+                    deadline: Optional[float] = None,
+                    clock: Callable[[], float] = time.monotonic) -> Tuple[list[Tuple[Attack, float]], float]:
+        # Select attacks with high probability
+        # TODO: consider more wise selection of candidates
+        attacks_with_proba = select_attacks_with_high_proba(
+            attacks_with_proba=attacks_with_proba, phase1_max_num=top_proba_attacks)
+        # if you can skip, add skip option to candidates.
+        if has_succeeded:
+            attacks_with_proba.append((None, 1))
+        return maximize_entropy(attacks_with_proba=attacks_with_proba,
+                                candidate_matrices=candidate_matrices, opponents=opponents,
+                                player=player, opened_cards=opened_cards,
+                                new_card=new_card, history=history,
+                                phase1_max_num=top_proba_attacks, max_samples=max_samples,
+                                max_depth=max_depth, sink=self.sink, table=self.table, deadline=deadline,
+                                clock=clock, profiler=self.profiler, rng=self.rng)
+
+
+class AnytimeMaxEntropy(MaxEntropy):
+    # MaxEntropy within a time budget per move.
+    # The search is repeated deeper and then wider until the deadline, and the
+    # attacks of the last completed search are chosen. If no search is
+    # completed, the attacks with the highest probability are chosen.
+    # clock gives the time in seconds for the deadline.
+    def __init__(self, time_budget: float = 1.0, top_proba_attacks: int = 3, max_samples: int = 1,
+                 max_depth: int = 3, name: Optional[str] = None, transposition_size: int = 10000,
+                 max_candidates: int = 100000, hand_samples: int = 1000,
+                 opening_book: Optional[OpeningBook] = None, clock: Callable[[], float] = time.monotonic):
+        super().__init__(top_proba_attacks=top_proba_attacks, max_samples=max_samples,
+                         name="anytime_max_entropy" if name is None else name,
+                         transposition_size=transposition_size, max_depth=max_depth,
+                         max_candidates=max_candidates, hand_samples=hand_samples,
+                         opening_book=opening_book)
+        self.time_budget = time_budget
+        self.clock = clock
+
+    def schedule(self, attacks_num: int, candidates_num: int):
+        # (max_depth, top_proba_attacks, max_samples) of each search
+        depth, top_proba_attacks, max_samples = 1, self.top_proba_attacks, self.max_samples
+        while True:
+            yield depth, top_proba_attacks, max_samples
+            if depth < self.max_depth:
+                depth += 1
+            elif top_proba_attacks < attacks_num or max_samples < candidates_num:
+                # Deeper nodes have fewer attacks and candidates than the root.
+                if top_proba_attacks < attacks_num:
+                    top_proba_attacks += 1
+                if max_samples < candidates_num:
+                    max_samples = min(max_samples * 2, candidates_num)
+            else:
+                return
+
+    def search(self, attacks_with_proba: list[Tuple[Attack, float]], candidate_matrices: dict[int, np.ndarray],
+               opponents: list[Player], player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+               history: list[Attack], has_succeeded: bool, meta: dict[str, Any]) -> Tuple[list[Tuple[Attack, float]], float]:
+        deadline = self.clock() + self.time_budget
+        best, _ = maximaize_probability(attacks_with_proba)
+        entropy = 0.0
+        completed = None
+        for max_depth, top_proba_attacks, max_samples in self.schedule(
+                attacks_num=len(attacks_with_proba),
+                # max_samples is per opponent
+                candidates_num=max(len(matrix) for matrix in candidate_matrices.values())):
+            try:
+                attacks, gain = self.search_with(attacks_with_proba=attacks_with_proba, candidate_matrices=candidate_matrices,
+                                                 opponents=opponents, player=player, opened_cards=opened_cards,
+                                                 new_card=new_card, history=history, has_succeeded=has_succeeded,
+                                                 max_depth=max_depth, top_proba_attacks=top_proba_attacks,
+                                                 max_samples=max_samples, deadline=deadline, clock=self.clock)
+            except SearchTimeout:
+                break
+            best, entropy = attacks, gain
+            completed = {"max_depth": max_depth, "top_proba_attacks": top_proba_attacks,
+                         "max_samples": max_samples}
+        meta["search"] = completed
+        return best, entropy
+
 
 class Human(LogicBase):
     def __init__(self, name: Optional[str] = None):
@@ -185,10 +383,11 @@ class Human(LogicBase):
             card_id=card_id), {}
 
 
-def get_bounds(opened_cards: list[Tuple[int, CardContent]], target: int) -> Tuple[CardContent, CardContent]:
-    # TODO: Update its logic to get more strict bounds.
+def get_bounds(opened_cards: list[Tuple[int, int]], target: int) -> Tuple[Optional[int], Optional[int]]:
+    # Bounds by the nearest opened cards.
+    # They are tightened by closed cards in between in calculate_local_candidates.
     # e.g. In the case of "W04 B?? W?? W?? W09", candidates of B?? are "B05,B06,B07",
-    # not "B05,B06,B07,B08,B09" which would be calculated by the current logic.
+    # not "B05,B06,B07,B08,B09".
     # copy
     opened_cards = list(opened_cards)
     opened_cards.append((target, None))
@@ -205,37 +404,24 @@ def get_bounds(opened_cards: list[Tuple[int, CardContent]], target: int) -> Tupl
     return lower_bound, upper_bound
 
 
-def apply_filters(color: str, impossible_cards: list[CardContent],
-                  lower_bound: Optional[CardContent], upper_bound: Optional[CardContent]):
-    candidates = [CardContent(color=color, number=number)
-                  for number in NUMBERS]
-
-    if lower_bound is not None:
-        candidates = [
-            candidate for candidate in candidates if lower_bound < candidate]
+@lru_cache(maxsize=LOCAL_CANDIDATES_CACHE_SIZE)
+def filter_local_candidates(color: str, lower_bound: Optional[int], upper_bound: Optional[int],
+                            impossible_mask: int) -> Tuple[int, ...]:
+    # Candidates of the color between the bounds, except impossible cards in the bitmask.
+    # The same arguments come again and again in a game, so results are memoized.
+    return tuple(candidate for candidate in (encode(color=color, number=number) for number in NUMBERS)
+                 if (lower_bound is None or lower_bound < candidate)
+                 and (upper_bound is None or candidate < upper_bound)
+                 and not (impossible_mask >> candidate) & 1)
 
-    if upper_bound is not None:
-        candidates = [
-            candidate for candidate in candidates if candidate < upper_bound]
 
-    return [candidate for candidate in candidates if (candidate not in impossible_cards)]
-
-
-def generate_tried_cards(card_id: Optional[int], history: list[Attack]) -> list[CardContent]:
-    # Consider history.
-    # Judge card's identity using card_id instead of position
-    # because position is variable due to insertion.
-    return [attack.card_content for attack in history
-            if attack.card_id == card_id]
-
-
-def generate_impossible_cards(opened_cards: list[CardContent], new_card: Optional[CardContent] = None, player: Optional[Player] = None) -> list[CardContent]:
-    impossible_cards = list(opened_cards)
+def generate_impossible_cards(opened_cards: list[CardContent], new_card: Optional[CardContent] = None, player: Optional[Player] = None) -> set[int]:
+    impossible_cards = {card.to_code() for card in opened_cards}
     if player is not None:
-        owned_by_self = player.hands.get_contents(referred_by=player.player_id)
-        impossible_cards += owned_by_self
+        owned_by_self = player.hands.get_codes(referred_by=player.player_id)
+        impossible_cards.update(owned_by_self)
     if new_card is not None:
-        impossible_cards.append(new_card)
+        impossible_cards.add(new_card.to_code())
     return impossible_cards
 
 
@@ -251,54 +437,178 @@ def maximaize_probability(attack_candidates: list[Tuple[Attack, float]]) -> Tupl
     return attacks, max_proba
 
 
-def get_local_candidates(card_id: Optional[int], history: list[Attack], impossible_cards: list[CardContent],
-                         opened_cards_locally: list[CardContent], color: str, position: int) -> list[CardContent]:
-    tried_cards = generate_tried_cards(
-        card_id=card_id, history=history)
-    impossible_cards_locally = impossible_cards + tried_cards
+def get_local_candidates(card_id: Optional[int], history: list[Attack], impossible_mask: int,
+                         opened_cards_locally: list[Tuple[int, int]], color: str, position: int) -> Tuple[int, ...]:
+    tried_mask = index_history(history).tried_mask(card_id)
     # Consider bounds.
     lower_bound, upper_bound = get_bounds(
         opened_cards=opened_cards_locally, target=position)
-    return apply_filters(color=color, impossible_cards=impossible_cards_locally,
-                         lower_bound=lower_bound, upper_bound=upper_bound)
+    return filter_local_candidates(color=color, lower_bound=lower_bound, upper_bound=upper_bound,
+                                   impossible_mask=impossible_mask | tried_mask)
 
 
-def calculate_hand_candidates(player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
-                              opponents: list[Player], history: list[Attack]) -> list[list[SimulationHands]]:
-    impossible_cards = generate_impossible_cards(
-        player=player, opened_cards=opened_cards, new_card=new_card)
+def calculate_local_candidates(player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+                               opponents: list[Player], history: list[Attack]) -> Tuple[list[list[int]], dict[int, list[int]]]:
+    impossible_mask = to_mask(generate_impossible_cards(
+        player=player, opened_cards=opened_cards, new_card=new_card))
 
     opponent_closed_positions: dict[int, list[int]] = defaultdict(list)
-    local_candidates_list: list[list[CardContent]] = []
+    local_candidates_list: list[Tuple[int, ...]] = []
     for opponent in opponents:
         closed_cards = opponent.hands.get_closed_cards()
-        opened_cards_locally = opponent.hands.get_opened_cards()
+        opened_cards_locally = opponent.hands.get_opened_codes()
         for position, card_id, color in closed_cards:
-            local_candidates: list[CardContent] = get_local_candidates(
-                card_id=card_id, history=history, impossible_cards=impossible_cards,
+            local_candidates = get_local_candidates(
+                card_id=card_id, history=history, impossible_mask=impossible_mask,
                 opened_cards_locally=opened_cards_locally, color=color, position=position)
 
             opponent_closed_positions[opponent.player_id].append(position)
             local_candidates_list.append(local_candidates)
 
+        # propagate bounds across runs of closed cards
+        positions = opponent_closed_positions.get(opponent.player_id, [])
+        if len(positions) == 0:
+            continue
+        slots: list[Sequence[int]] = opened_slots(opponent.hands)
+        offset = len(local_candidates_list) - len(positions)
+        for j, position in enumerate(positions):
+            slots[position] = local_candidates_list[offset+j]
+        narrowed = narrow_slots(slots)
+        for j, position in enumerate(positions):
+            local_candidates_list[offset+j] = narrowed[position]
+    return local_candidates_list, opponent_closed_positions
+
+
+def calculate_hand_candidates(player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+                              opponents: list[Player], history: list[Attack]) -> list[list[Tuple[int, Tuple[int, ...]]]]:
+    local_candidates_list, opponent_closed_positions = calculate_local_candidates(
+        player=player, opened_cards=opened_cards, new_card=new_card,
+        opponents=opponents, history=history)
+
     return enumerate_candidates(
         local_candidates_list, opponent_closed_positions, opponents)
 
 
+def count_hand_candidates(player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+                          opponents: list[Player], history: list[Attack]) -> Tuple[int, dict[Tuple[int, int], dict[int, int]]]:
+    # Same as len(calculate_hand_candidates(...)) and the counter of
+    # transform_candidates_from_hand_to_attack, but computed by counting
+    # ascending hands position by position instead of enumerating them.
+    local_candidates_list, opponent_closed_positions = calculate_local_candidates(
+        player=player, opened_cards=opened_cards, new_card=new_card,
+        opponents=opponents, history=history)
+
+    return count_slots(build_slots(
+        local_candidates_list, opponent_closed_positions, opponents))
+
+
+def build_slots(local_candidates_list: list[list[int]],
+                opponent_closed_positions: dict[int, list[int]],
+                opponents: list[Player]) -> list[Tuple[int, list[int], list[list[int]]]]:
+    # candidates of every position of each opponent's hands.
+    # An opened card is a slot with a single candidate.
+    opponents_by_id = {opponent.player_id: opponent for opponent in opponents}
+    slots_list = []
+    offset = 0
+    for opponent_id, positions in opponent_closed_positions.items():
+        slots = opened_slots(opponents_by_id[opponent_id].hands)
+        for j, position in enumerate(positions):
+            slots[position] = local_candidates_list[offset+j]
+        offset += len(positions)
+        slots_list.append((opponent_id, positions, slots))
+    return slots_list
+
+
+def calculate_candidate_matrices(player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+                                 opponents: list[Player], history: list[Attack]) -> dict[int, np.ndarray]:
+    # NumPy backend of calculate_hand_candidates.
+    # Hands of each opponent are independent, so the candidates are held per opponent
+    # as a matrix of codes (candidates x positions) instead of their joint product.
+    local_candidates_list, opponent_closed_positions = calculate_local_candidates(
+        player=player, opened_cards=opened_cards, new_card=new_card,
+        opponents=opponents, history=history)
+    return {opponent_id: enumerate_candidate_matrix(slots)
+            for opponent_id, _, slots in build_slots(local_candidates_list, opponent_closed_positions, opponents)}
+
+
+def opened_slots(hands) -> list[Optional[list[int]]]:
+    # Slots of opened cards. Closed ones are None.
+    slots: list[Optional[list[int]]] = [None] * len(hands)
+    for position, code in hands.get_opened_codes():
+        slots[position] = [code]
+    return slots
+
+
+def lookup_opening(opening_book: Optional[OpeningBook], player: Player, opened_cards: list[CardContent],
+                   new_card: Optional[CardContent], opponents: list[Player],
+                   history: list[Attack]) -> Optional[Tuple[int, dict[Tuple[int, int], dict[int, int]]]]:
+    # Same as count_hand_candidates in opening situations, from the opening book.
+    # None if it is not an opening situation. The book has hands of a single
+    # opponent, and hands of several opponents are coupled by count_disjoint.
+    if opening_book is None or new_card is None or len(history) > 0 or len(opened_cards) > 0 \
+            or len(opponents) != 1:
+        return None
+    opponent, = opponents
+    if len(opponent.hands.get_opened_codes()) > 0:
+        return None
+    known_codes = player.hands.get_codes(referred_by=player.player_id) + [new_card.to_code()]
+    table = opening_book.lookup(
+        known_codes=known_codes, colors=[color for _, _, color in opponent.hands.get_closed_cards()])
+    if table is None:
+        return None
+    counter: dict[Tuple[int, int], dict[int, int]] = defaultdict(dict)
+    for position, counts in enumerate(table):
+        counter[(opponent.player_id, position)] = counts
+    return sum(table[0].values()), counter
+
+
+def count_candidate_matrices(candidate_matrices: dict[int, np.ndarray]) -> int:
+    total = 1
+    for matrix in candidate_matrices.values():
+        total *= len(matrix)
+    return total
+
+
+def transform_matrices_to_attack(candidate_matrices: dict[int, np.ndarray],
+                                 opponents: list[Player], player: Player) -> list[Tuple[Attack, float]]:
+    # NumPy backend of transform_candidates_from_hand_to_attack.
+    counter: dict[Tuple[int, int], dict[int, int]] = defaultdict(dict)
+    if count_candidate_matrices(candidate_matrices) == 0:
+        return []
+    for opponent in opponents:
+        if opponent.player_id not in candidate_matrices:
+            continue
+        matrix = candidate_matrices[opponent.player_id]
+        for position, _, _ in opponent.hands.get_closed_cards():
+            codes, counts = np.unique(matrix[:, position], return_counts=True)
+            counter[(opponent.player_id, position)] = dict(
+                zip(codes.tolist(), counts.tolist()))
+    return get_attacks_with_proba(counter=counter, opponents=opponents, player=player)
+
+
+def calculate_attacks_with_proba(player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+                                 opponents: list[Player], history: list[Attack]) -> Tuple[int, list[Tuple[Attack, float]]]:
+    # Probabilities of all attacks from counts, the reference of calculate_batch_attacks_with_proba.
+    total, counter = count_hand_candidates(
+        player=player, opened_cards=opened_cards, new_card=new_card,
+        opponents=opponents, history=history)
+    return total, get_attacks_with_proba(counter=counter, opponents=opponents, player=player)
+
+
 def transform_candidates_from_hand_to_attack(candidate_hands_list, opponents, player):
     # get attacks with probability
-    counter: dict[Tuple[int, int], dict[str, int]
+    counter: dict[Tuple[int, int], dict[int, int]
                   ] = defaultdict(lambda: defaultdict(int))
-    for sim_hands_list in candidate_hands_list:
-        for opponent_id, sim_hands in sim_hands_list:
-            for position, card in enumerate(sim_hands.cards):
-                counter[(opponent_id, position)][str(card.get_content())] += 1
+    for hands_list in candidate_hands_list:
+        for opponent_id, codes in hands_list:
+            for position, code in enumerate(codes):
+                counter[(opponent_id, position)][code] += 1
 
     return get_attacks_with_proba(
         counter=counter, opponents=opponents, player=player)
 
 
-def get_attacks_with_proba(counter: dict[Tuple[int, int], dict[str, int]],
+def get_attacks_with_proba(counter: dict[Tuple[int, int], dict[int, int]],
                            opponents: list[Player], player: Player) -> list[Tuple[Attack, float]]:
     attacks_with_proba: list[Tuple[Attack, float]] = []
     for opponent in opponents:
@@ -306,12 +616,13 @@ def get_attacks_with_proba(counter: dict[Tuple[int, int], dict[str, int]],
         for position, card_id, _ in closed_cards:
             inner_counter = counter[(opponent.player_id, position)]
             denominator = sum([freq for freq in inner_counter.values()])
-            for card_content, count in inner_counter.items():
+            for code, count in inner_counter.items():
+                color, number = decode(code)
                 attack = Attack(
                     card_id=card_id,
                     position=position,
-                    color=card_content[0],
-                    number=int(card_content[1:]),
+                    color=color,
+                    number=number,
                     attacked_to=opponent.player_id,
                     attacked_by=player.player_id
                 )
@@ -320,68 +631,101 @@ def get_attacks_with_proba(counter: dict[Tuple[int, int], dict[str, int]],
     return attacks_with_proba
 
 
-def enumerate_candidates(local_candidates_list: list[list[CardContent]],
+def enumerate_candidates(local_candidates_list: list[list[int]],
                          opponent_closed_positions: dict[int, list[int]],
-                         opponents: list[Player]) -> list[list[SimulationHands]]:
-    fuga = list(itertools.product(*local_candidates_list))
-    results: list[list[SimulationHands]] = []
-    for card_contents in fuga:
-        sim_hands_list = []
-        for i, (opponent_id, positions) in enumerate(opponent_closed_positions.items()):
-            tmp = [
-                opponent for opponent in opponents if opponent.player_id == opponent_id]
-            if len(tmp) == 0:
-                raise Exception()
-            opponent = tmp[0]
-            sim_hands = SimulationHands(cards=opponent.hands.cards)
-            for j, position in enumerate(positions):
-                content = card_contents[i+j]
-                sim_hands = sim_hands.overwrite(
-                    position=position, content=content)
-            sim_hands_list.append((opponent_id, sim_hands))
-        if all([sim_hands.is_valid() for _, sim_hands in sim_hands_list]):
-            results.append(sim_hands_list)
+                         opponents: list[Player]) -> list[list[Tuple[int, Tuple[int, ...]]]]:
+    # Search the closed cards in order (opponent by opponent, left to right) and
+    # prune as soon as a card breaks the strictly ascending order of its hands,
+    # or is already in the hands of another opponent.
+    # A strictly ascending hand is both sorted and unique, so every combination
+    # reaching the end is valid and they come out in itertools.product order.
+    opponents_by_id = {opponent.player_id: opponent for opponent in opponents}
+    codes_by_opponent: dict[int, list[Optional[int]]] = {}
+    slots: list[Tuple[int, int, list[int]]] = []
+    offset = 0
+    for opponent_id, positions in opponent_closed_positions.items():
+        if opponent_id not in opponents_by_id:
+            raise Exception(f"Unknown opponent: {opponent_id}")
+        opponent = opponents_by_id[opponent_id]
+        codes: list[Optional[int]] = [None] * len(opponent.hands)
+        for position, code in opponent.hands.get_opened_codes():
+            codes[position] = code
+        opened_codes = [code for code in codes if code is not None]
+        for lower, upper in zip(opened_codes, opened_codes[1:]):
+            if not lower < upper:
+                return []
+        codes_by_opponent[opponent_id] = codes
+        for j, position in enumerate(positions):
+            slots.append(
+                (opponent_id, position, local_candidates_list[offset+j]))
+        offset += len(positions)
+
+    results: list[list[Tuple[int, Tuple[int, ...]]]] = []
+
+    def search(index: int) -> None:
+        if index == len(slots):
+            results.append([(opponent_id, tuple(codes))
+                            for opponent_id, codes in codes_by_opponent.items()])
+            return
+        opponent_id, position, candidates = slots[index]
+        codes = codes_by_opponent[opponent_id]
+        # codes already in the hands of opponents searched before
+        used = {code for other_id, other_codes in codes_by_opponent.items() if other_id != opponent_id
+                for code in other_codes if code is not None}
+        # closed cards on the left are already fixed by the search.
+        lower = codes[position-1] if position > 0 else None
+        # closed cards on the right are checked when they are fixed.
+        upper = codes[position+1] if position < len(codes) - 1 else None
+        for candidate in candidates:
+            if lower is not None and not lower < candidate:
+                continue
+            if upper is not None and not candidate < upper:
+                continue
+            if candidate in used:
+                continue
+            codes[position] = candidate
+            search(index+1)
+        codes[position] = None
+
+    search(0)
     return results
 
 
-def estimate_self_entropy(candidate_hands_list, opponents, player, opened_cards, new_card, history, max_samples):
+def estimate_self_entropy(candidate_matrices, opponents, player, opened_cards, new_card, history, max_samples,
+                          rng: random.Random = random):
+    if new_card is None:
+        # the deck is empty, so the player has no card to reveal.
+        # it runs out early with many players.
+        return 0.0, 0.0
     entropy_list_opened = []
     entropy_list_closed = []
-    # reduce complexty
-    sampled_hands_list = random.sample(
-        candidate_hands_list, min(max_samples, len(candidate_hands_list)))
-
-    for candidate_hands in sampled_hands_list:
-        # assume that single opponent
-        # TODO: support multi opponents
-        assert len(candidate_hands) == 1
-        for tentative_attacker_id, tentative_hand in candidate_hands:
-            # set candidate_hand to opponent
-            opponents_sim = copy.deepcopy(opponents)
-            opponent_sim = opponents_sim[0]
-            opponent_sim.hands = Hands(tentative_hand.cards)
-            # set opponent to tentative attacker
-            tentative_attacker = opponent_sim
-            # set player to original attacker
-            original_attacker = copy.copy(player)
-            # calculate hand_candidates of before state
-            before_num = len(calculate_hand_candidates(
-                player=tentative_attacker, opened_cards=opened_cards, new_card=None, opponents=[original_attacker], history=history))
-
-            # calculate hand_candidates of after state with not opened new_card
-            closed_card = Card(color=new_card.color,
-                               number=new_card.number, opened=False)
-            inserted_at = original_attacker.insert(closed_card)
+    # set player to original attacker
+    original_attacker = as_simulation_player(
+        player, referred_by=player.player_id)
+    # Each opponent knows only its own hands besides opened cards,
+    # so opponents are taken one by one and their entropies are averaged.
+    for tentative_attacker_id, matrix in candidate_matrices.items():
+        # reduce complexty
+        sampled_rows = rng.sample(
+            range(len(matrix)), min(max_samples, len(matrix)))
+        for row in sampled_rows:
+            tentative_hand = tuple(matrix[row].tolist())
+            # set candidate_hand to opponent as tentative attacker
+            tentative_attacker = SimulationPlayer(player_id=tentative_attacker_id, hands=UndoableHands.from_codes(
+                codes=tentative_hand, owned_by=tentative_attacker_id))
+            # count hand_candidates of before state
+            before_num, _ = count_hand_candidates(
+                player=tentative_attacker, opened_cards=opened_cards, new_card=None, opponents=[original_attacker], history=history)
+
+            # count hand_candidates of after state with not opened new_card
+            inserted_at = original_attacker.insert(new_card.to_code())
             # TODO: sample card for new_card. new_card is another source of information.
             # Without it, the estimation accuracy may be bad.
-            after_closed_candidates = calculate_hand_candidates(
+            after_num_closed, after_counter = count_hand_candidates(
                 player=tentative_attacker, opened_cards=opened_cards, new_card=None, opponents=[original_attacker], history=history)
-            after_num_closed = len(after_closed_candidates)
-            after_num_opened = 0
-            for hands_list in after_closed_candidates:
-                assert len(hands_list) == 1, hands_list
-                if hands_list[0][1].cards[inserted_at].get_content() == new_card:
-                    after_num_opened += 1
+            original_attacker.undo()
+            after_num_opened = after_counter[(original_attacker.player_id, inserted_at)].get(
+                new_card.to_code(), 0)
             # print(f"Not Open: {before_num} -> {after_num_closed}")
             # print(f"Open: {before_num} -> {after_num_opened}")
             entropy_list_opened.append(np.log(before_num/after_num_opened))
@@ -393,58 +737,97 @@ def estimate_self_entropy(candidate_hands_list, opponents, player, opened_cards,
     return entropy_opened, entropy_closed
 
 
+class SearchTimeout(Exception):
+    # maximize_entropy has passed its deadline.
+    pass
+
+
 def select_attacks_with_high_proba(attacks_with_proba, phase1_max_num):
     return sorted(
         attacks_with_proba, key=lambda x: x[1], reverse=True)[:min(phase1_max_num, len(attacks_with_proba))]
 
 
-def maximize_entropy(attacks_with_proba, candidate_hands_list, opponents, player,
+def maximize_entropy(attacks_with_proba, candidate_matrices, opponents, player,
                      opened_cards, new_card, history, phase1_max_num, max_samples,
-                     depth=0, max_depth=3) -> Tuple[Optional[list[Tuple[Attack, float]]], float]:
+                     depth=0, max_depth=3, sink: EventSink = NullSink(),
+                     table: Optional[TranspositionTable] = None,
+                     deadline: Optional[float] = None,
+                     clock: Callable[[], float] = time.monotonic,
+                     profiler: Profiler = NullProfiler(),
+                     rng: random.Random = random) -> Tuple[Optional[list[Tuple[Attack, float]]], float]:
+    if deadline is not None and clock() > deadline:
+        raise SearchTimeout()
+    profiler.node(depth)
     if depth == max_depth:
-        print("> "*depth+"Recursion reached max_depth.")
+        sink.emit("search_max_depth", depth=depth)
         return None, 0
 
+    # Different orders of attacks reach the same node.
+    if table is not None:
+        key = transposition_key(candidate_matrices=candidate_matrices, opponents=opponents,
+                                remaining_depth=max_depth-depth, phase1_max_num=phase1_max_num,
+                                max_samples=max_samples)
+        cached = table.get(key)
+        if cached is not None:
+            return cached
+
+    # hands are opened and restored in place during the search
+    player = as_simulation_player(player, referred_by=player.player_id)
+    opponents = [as_simulation_player(opponent, referred_by=player.player_id)
+                 for opponent in opponents]
+    opponents_by_id = {opponent.player_id: opponent for opponent in opponents}
+
     max_gain = -10000000
     max_attacks = []
-    entropy_opened, entropy_closed = estimate_self_entropy(candidate_hands_list=candidate_hands_list, opponents=opponents,
-                                                           player=player, opened_cards=opened_cards, new_card=new_card,
-                                                           history=history, max_samples=max_samples)
+    with profiler.phase("estimate_self_entropy"):
+        entropy_opened, entropy_closed = estimate_self_entropy(candidate_matrices=candidate_matrices, opponents=opponents,
+                                                               player=player, opened_cards=opened_cards, new_card=new_card,
+                                                               history=history, max_samples=max_samples, rng=rng)
     for attack, p in attacks_with_proba:
         if attack is None:
-            print("> "*depth + "Skip")
+            sink.emit("search_skip", depth=depth)
             # the case of skip
             entropy_gain = - entropy_closed
         else:
-            print("> "*depth + f"{attack}, {p}")
-            filtered = [
-                candidate_hands for candidate_hands in candidate_hands_list for opponent, hands in candidate_hands
-                if (opponent == attack.attacked_to) and (hands.cards[attack.position].get_content() == attack.card_content)]
-
-            # copy
-            opponents_sim = copy.deepcopy(opponents)
-            for opponent_sim in opponents_sim:
-                if opponent_sim.player_id == attack.attacked_to:
-                    opponent_sim.open(position=attack.position)
-
-            next_attacks = transform_candidates_from_hand_to_attack(
-                candidate_hands_list=filtered, opponents=opponents_sim, player=player)
-            next_attacks = select_attacks_with_high_proba(
-                attacks_with_proba=next_attacks, phase1_max_num=phase1_max_num)
-
-            attacks_with_proba_equals_to_1 = [
-                (attack, proba) for attack, proba in next_attacks if proba == 1]
-            if len(next_attacks) == 0 or len(attacks_with_proba_equals_to_1) == len(next_attacks):
-                # How do we set gain for win?
-                descendant_entropy = 10
+            sink.emit("search_attack", depth=depth, attack=attack, proba=p)
+            filtered = dict(candidate_matrices)
+            matrix = filtered[attack.attacked_to]
+            filtered[attack.attacked_to] = matrix[matrix[:, attack.position]
+                                                  == attack.card_content.to_code()]
+
+            if len(filtered[attack.attacked_to]) == 0:
+                # No sampled hands have the card though the exact counts do,
+                # so nothing is known about what follows the success.
+                descendant_entropy = 0
             else:
-                # Skip can be chosen after success of attacks
-                next_attacks.append((None, 1))
-                _, descendant_entropy = maximize_entropy(attacks_with_proba=next_attacks,
-                                                         candidate_hands_list=filtered, opponents=opponents_sim,
-                                                         player=player, opened_cards=opened_cards, new_card=new_card,
-                                                         history=history, depth=depth+1, phase1_max_num=phase1_max_num,
-                                                         max_samples=max_samples)
+                attacked = opponents_by_id[attack.attacked_to]
+                attacked.open(position=attack.position,
+                              code=attack.card_content.to_code())
+                try:
+                    with profiler.phase("transform_matrices_to_attack"):
+                        next_attacks = transform_matrices_to_attack(
+                            candidate_matrices=filtered, opponents=opponents, player=player)
+                    next_attacks = select_attacks_with_high_proba(
+                        attacks_with_proba=next_attacks, phase1_max_num=phase1_max_num)
+
+                    attacks_with_proba_equals_to_1 = [
+                        (attack, proba) for attack, proba in next_attacks if proba == 1]
+                    if len(next_attacks) == 0 or len(attacks_with_proba_equals_to_1) == len(next_attacks):
+                        # How do we set gain for win?
+                        descendant_entropy = 10
+                    else:
+                        # Skip can be chosen after success of attacks
+                        next_attacks.append((None, 1))
+                        _, descendant_entropy = maximize_entropy(attacks_with_proba=next_attacks,
+                                                                 candidate_matrices=filtered, opponents=opponents,
+                                                                 player=player, opened_cards=opened_cards,
+                                                                 new_card=new_card, history=history, depth=depth+1,
+                                                                 phase1_max_num=phase1_max_num, max_depth=max_depth,
+                                                                 max_samples=max_samples, sink=sink, table=table,
+                                                                 deadline=deadline, clock=clock, profiler=profiler,
+                                                                 rng=rng)
+                finally:
+                    attacked.undo()
 
             entropy_gain = calculate_entropy_gain(
                 p=p, descendant_entropy=descendant_entropy, entropy_opened=entropy_opened)
@@ -454,11 +837,26 @@ def maximize_entropy(attacks_with_proba, candidate_hands_list, opponents, player
             max_attacks = [(attack, p)]
         elif abs(max_gain-entropy_gain) < 0.0001:
             max_attacks.append((attack, p))
-    print("> "*depth+f"{max_attacks} {max_gain} (depth={depth})")
+    sink.emit("search_result", depth=depth,
+              attacks=max_attacks, gain=max_gain)
+
+    if table is not None:
+        table.put(key, (max_attacks, max_gain))
 
     return max_attacks, max_gain
 
 
+def transposition_key(candidate_matrices: dict[int, np.ndarray], opponents: list[Player],
+                      remaining_depth: int, phase1_max_num: int, max_samples: int):
+    # A node of maximize_entropy is determined by the opened cards, the candidates and
+    # the parameters of the search under it within a move.
+    opened = tuple((opponent.player_id, tuple(opponent.hands.get_opened_codes()))
+                   for opponent in opponents)
+    candidates = tuple((opponent_id, fingerprint(matrix))
+                       for opponent_id, matrix in candidate_matrices.items())
+    return opened, candidates, remaining_depth, phase1_max_num, max_samples
+
+
 def calculate_entropy_gain(p, descendant_entropy, entropy_opened):
     if p == 1:
         return descendant_entropy
@@ -0,0 +1,118 @@
+import json
+from itertools import combinations
+from math import comb
+from typing import Any, Optional, Sequence
+import numpy as np
+from tools.card import encode
+from tools.consts import COLORS, NUMBERS, MAX_HANDS
+from tools.counting import batch_count_ascending
+
+
+class OpeningBook:
+    # Attack probabilities of opening situations: every player has max_hands cards,
+    # no card is opened and no attack is made yet.
+    # Then candidates of an opponent's hands depend only on the codes the attacker
+    # knows (own hands and the drawn card) and the colors of the opponent's hands.
+    # counts[known, colors, position, number] is the number of the opponent's hands
+    # with the number at the position, where known is the rank of the indexes of the
+    # known codes in the codes of the deck and colors is the color indexes of the
+    # opponent's hands as digits.
+    def __init__(self, counts: np.ndarray, colors: list[str] = COLORS, numbers: list[int] = NUMBERS,
+                 path: Optional[str] = None):
+        self.counts = counts
+        self.colors = colors
+        self.numbers = numbers
+        self.max_hands = counts.shape[2]
+        self.codes = sorted(encode(color=color, number=number)
+                            for color in colors for number in numbers)
+        self.indexes = {code: index for index, code in enumerate(self.codes)}
+        # file of counts, if it is loaded
+        self.path = path
+
+    def __reduce__(self):
+        # Workers load the file again instead of receiving a copy of the counts.
+        if self.path is not None:
+            return OpeningBook.load, (self.path, self.colors, self.numbers, self.max_hands)
+        return OpeningBook, (self.counts, self.colors, self.numbers)
+
+    def __deepcopy__(self, memo):
+        # read-only, so copies of logics share it
+        return self
+
+    @classmethod
+    def generate(cls, colors: list[str] = COLORS, numbers: list[int] = NUMBERS,
+                 max_hands: int = MAX_HANDS, chunk_size: int = 1000) -> 'OpeningBook':
+        codes = sorted(encode(color=color, number=number)
+                       for color in colors for number in numbers)
+        codes_num = codes[-1] + 1
+        code_colors = np.asarray([code % len(colors) for code in range(codes_num)])
+        # codes which are not in the deck
+        missing = np.ones(codes_num, dtype=bool)
+        missing[codes] = False
+        # own hands and the drawn card, in the order of the ranks of their indexes
+        indexes = list(combinations(range(len(codes)), max_hands + 1))
+        indexes.sort(key=rank)
+        known = np.asarray(codes, dtype=np.int64)[np.asarray(indexes, dtype=np.int64)]
+        patterns = np.asarray([[pattern // len(colors) ** position % len(colors) for position in range(max_hands)]
+                               for pattern in range(len(colors) ** max_hands)])
+        # codes of the numbers of the color at each position of each pattern
+        number_codes = np.asarray([[encode(color=color, number=number) for number in numbers]
+                                   for color in colors])[patterns]
+
+        counts = np.zeros((len(known), len(patterns), max_hands, len(numbers)), dtype=np.uint32)
+        for start in range(0, len(known), chunk_size):
+            chunk = known[start:start+chunk_size]
+            impossible = np.tile(missing, (len(chunk), 1))
+            impossible[np.arange(len(chunk))[:, np.newaxis], chunk] = True
+            # (known, pattern, position, code)
+            domains = (code_colors[np.newaxis, np.newaxis, np.newaxis, :] == patterns[np.newaxis, :, :, np.newaxis]) & \
+                ~impossible[:, np.newaxis, np.newaxis, :]
+            _, marginals = batch_count_ascending(
+                domains.reshape(-1, max_hands, codes_num))
+            marginals = marginals.reshape(len(chunk), len(patterns), max_hands, codes_num)
+            counts[start:start+len(chunk)] = np.take_along_axis(
+                marginals, np.broadcast_to(number_codes, (len(chunk),) + number_codes.shape), axis=3)
+        # the smallest type for counts
+        return cls(counts=counts.astype(np.min_scalar_type(counts.max())), colors=colors, numbers=numbers)
+
+    def config(self) -> dict[str, Any]:
+        return {"colors": list(self.colors), "numbers": list(self.numbers), "max_hands": self.max_hands}
+
+    def save(self, path: str) -> None:
+        # The config is kept in path + ".json" beside the counts.
+        with open(path, "wb") as f:
+            np.save(f, self.counts)
+        with open(path + ".json", "w") as f:
+            json.dump(self.config(), f)
+
+    @classmethod
+    def load(cls, path: str, colors: list[str] = COLORS, numbers: list[int] = NUMBERS,
+             max_hands: int = MAX_HANDS) -> 'OpeningBook':
+        # Memory-mapped, so processes share the pages and only used entries are read.
+        config = {"colors": list(colors), "numbers": list(numbers), "max_hands": max_hands}
+        with open(path + ".json") as f:
+            stored = json.load(f)
+        if stored != config:
+            raise Exception(f"{path} is an opening book of another config: {stored}, not {config}.")
+        return cls(counts=np.load(path, mmap_mode="r"), colors=colors, numbers=numbers, path=path)
+
+    def lookup(self, known_codes: list[int], colors: list[str]) -> Optional[list[dict[int, int]]]:
+        # Counts of codes at each position of an opponent's hands.
+        # None if the situation is not an opening one.
+        known_codes = set(known_codes)
+        if len(known_codes) != self.max_hands + 1 or len(colors) != self.max_hands \
+                or not known_codes <= self.indexes.keys():
+            return None
+        pattern = 0
+        for position, color in enumerate(colors):
+            pattern += self.colors.index(color) * len(self.colors) ** position
+        table = self.counts[rank(sorted(self.indexes[code] for code in known_codes)), pattern]
+        return [{encode(color=color, number=number): int(count)
+                 for number, count in zip(self.numbers, table[position].tolist()) if count > 0}
+                for position, color in enumerate(colors)]
+
+
+def rank(indexes: Sequence[int]) -> int:
+    # Rank of sorted distinct indexes among the combinations of the same size
+    # (combinatorial number system).
+    return sum(comb(index, i + 1) for i, index in enumerate(indexes))
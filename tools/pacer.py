@@ -0,0 +1,35 @@
+import asyncio
+import time
+from abc import ABC, abstractmethod
+
+
+class Pacer(ABC):
+    # Decide how long the game waits before judging an attack.
+    @abstractmethod
+    def pace(self) -> None:
+        pass
+
+    async def pace_async(self) -> None:
+        self.pace()
+
+
+class NoPacer(Pacer):
+    # Don't wait. The default for programmatic use.
+    def pace(self) -> None:
+        pass
+
+    async def pace_async(self) -> None:
+        pass
+
+
+class SleepPacer(Pacer):
+    # Wait for a while like a human dealer. Used by the interactive front end.
+    # In Game.start_async, it waits without blocking other games on the event loop.
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def pace(self) -> None:
+        time.sleep(self.seconds)
+
+    async def pace_async(self) -> None:
+        await asyncio.sleep(self.seconds)
@@ -0,0 +1,68 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterator
+
+
+class Profiler:
+    # Wall time and call counts of phases, counts of candidates and
+    # search nodes per depth within an act.
+    # Phases may be nested, so their times are inclusive.
+    enabled = True
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.seconds: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.counts: dict[str, int] = {}
+        self.nodes: dict[int, int] = defaultdict(int)
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            self.calls[name] += 1
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = value
+
+    def node(self, depth: int) -> None:
+        self.nodes[depth] += 1
+
+    def result(self) -> dict[str, Any]:
+        return {"seconds": dict(self.seconds), "calls": dict(self.calls),
+                "counts": dict(self.counts), "nodes": dict(self.nodes)}
+
+
+class NullProfiler(Profiler):
+    # Record nothing. Used unless profiling is enabled.
+    enabled = False
+
+    def phase(self, name: str):
+        return nullcontext()
+
+    def count(self, name: str, value: int) -> None:
+        pass
+
+    def node(self, depth: int) -> None:
+        pass
+
+
+def aggregate_profiles(profiles: list[dict[str, Any]]) -> dict[str, Any]:
+    # Sum profiles of acts, e.g. of a game.
+    seconds: dict[str, float] = defaultdict(float)
+    calls: dict[str, int] = defaultdict(int)
+    nodes: dict[int, int] = defaultdict(int)
+    for profile in profiles:
+        for name, value in profile["seconds"].items():
+            seconds[name] += value
+        for name, value in profile["calls"].items():
+            calls[name] += value
+        for depth, value in profile["nodes"].items():
+            nodes[depth] += value
+    return {"acts": len(profiles), "seconds": dict(seconds), "calls": dict(calls), "nodes": dict(nodes)}
@@ -0,0 +1,47 @@
+import json
+import os
+from typing import Any, Iterator
+
+
+class ResultLog:
+    # Append-only file of per-game records as JSON lines.
+    # Records are flushed one by one, so an interrupted run loses at most
+    # the line being written, which is dropped when the run is resumed.
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+
+    def read(self) -> Iterator[dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as file:
+            for line in file:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+
+    def repair(self) -> None:
+        # Cut an incomplete last line off, so that appended records start on a new line.
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as file:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            end = size
+            while end > 0:
+                file.seek(end - 1)
+                if file.read(1) == b"\n":
+                    break
+                end -= 1
+            if end < size:
+                file.truncate(end)
+
+    def write(self, record: dict[str, Any]) -> None:
+        if self.file is None:
+            self.file = open(self.path, "a")
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
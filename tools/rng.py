@@ -0,0 +1,13 @@
+import random
+from typing import Tuple
+import numpy as np
+
+
+def spawn_streams(seed: int, n: int) -> list[Tuple[random.Random, np.random.Generator]]:
+    # Independent random streams derived from a single seed.
+    # Each stream has a random.Random and a NumPy Generator.
+    streams = []
+    for sequence in np.random.SeedSequence(seed).spawn(n):
+        state = int.from_bytes(sequence.generate_state(4).tobytes(), "little")
+        streams.append((random.Random(state), np.random.default_rng(sequence)))
+    return streams
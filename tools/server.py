@@ -0,0 +1,230 @@
+import asyncio
+import json
+import random
+from concurrent.futures import Executor
+from typing import Any, Callable, Optional, Tuple
+from tools.attack import Attack
+from tools.card import Card, CardContent
+from tools.events import EventSink, NullSink, to_record
+from tools.game import Game
+from tools.logic import LogicBase
+from tools.pacer import Pacer
+from tools.player import Player
+from tools.tournament import derive_seed
+
+# fields of events which would tell clients what they can't see
+HIDDEN_FIELDS = {"game_start": ("deck",)}
+
+
+def send(writer: asyncio.StreamWriter, message: dict[str, Any]) -> None:
+    writer.write((json.dumps(message) + "\n").encode())
+
+
+class StreamSink(EventSink):
+    # Send events of a game to a client as JSON lines.
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def emit(self, event: str, **fields: Any) -> None:
+        hidden = HIDDEN_FIELDS.get(event, ())
+        record = {key: to_record(value)
+                  for key, value in fields.items() if key not in hidden}
+        record["event"] = event
+        send(self.writer, record)
+
+
+def card_view(card: Card, referred_by: int) -> dict[str, Any]:
+    # the number is None if the card is not visible to the player
+    visible = card.opened or card.owned_by == referred_by
+    return {"color": card.get_color(), "number": card.get_number(referred_by=referred_by) if visible else None,
+            "opened": card.opened}
+
+
+def act_request(player: Player, opponents: list[Player], new_card: Optional[CardContent],
+                has_succeeded: bool) -> dict[str, Any]:
+    # what a client needs to decide an attack
+    return {"event": "act", "player_id": player.player_id,
+            "hands": [card_view(card, referred_by=player.player_id) for card in player.hands.cards],
+            "opponents": [{"player_id": opponent.player_id, "name": opponent.name,
+                           "hands": [card_view(card, referred_by=player.player_id)
+                                     for card in opponent.hands.cards]}
+                          for opponent in opponents],
+            "new_card": None if new_card is None else {"color": new_card.color, "number": new_card.number},
+            "has_succeeded": has_succeeded}
+
+
+def parse_command(command: Any, player: Player, opponents: list[Player],
+                  has_succeeded: bool) -> Tuple[Optional[Attack], Optional[str]]:
+    # Attack (None for skip) and an error message if the command is invalid.
+    # A command is {"skip": true} or {"position", "color", "number", "attacked_to"}.
+    # attacked_to can be omitted with a single opponent.
+    if not isinstance(command, dict):
+        return None, "A command should be a JSON object."
+    if command.get("skip"):
+        if not has_succeeded:
+            return None, "You can't skip your next attack because your attack has not succeeded yet."
+        return None, None
+    opponents_by_id = {opponent.player_id: opponent for opponent in opponents}
+    attacked_to = command.get("attacked_to")
+    if attacked_to is None and len(opponents) == 1:
+        attacked_to = opponents[0].player_id
+    if attacked_to not in opponents_by_id:
+        return None, "attacked_to should be the player id of an opponent."
+    cards = opponents_by_id[attacked_to].hands.cards
+    position = command.get("position")
+    if not isinstance(position, int) or not 0 <= position < len(cards):
+        return None, f"position should be from 0 to {len(cards) - 1}."
+    card = cards[position]
+    if card.opened:
+        return None, "Specified card has already been opened!"
+    try:
+        attack = Attack(card_id=card.card_id, position=position, color=command.get("color"),
+                        number=command.get("number"), attacked_to=attacked_to, attacked_by=player.player_id)
+    except Exception as e:
+        return None, str(e)
+    return attack, None
+
+
+class RemoteHuman(LogicBase):
+    # A human playing through a client connected to GameServer.
+    # Each act sends an act request and waits for a command without blocking other games.
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, name: Optional[str] = None):
+        self.reader = reader
+        self.writer = writer
+        self.name = "human" if name is None else name
+
+    def act(self, player: Player, opponents, new_card, opened_cards, history, has_succeeded):
+        raise Exception("RemoteHuman can act only in Game.start_async.")
+
+    async def act_async(self, player: Player, opponents: list[Player], new_card: Optional[CardContent],
+                        opened_cards: list[CardContent], history: list[Attack], has_succeeded: bool):
+        while True:
+            send(self.writer, act_request(player=player, opponents=opponents,
+                                          new_card=new_card, has_succeeded=has_succeeded))
+            await self.writer.drain()
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("The client has disconnected.")
+            try:
+                command = json.loads(line)
+            except json.JSONDecodeError:
+                command = None
+            attack, message = parse_command(command, player=player, opponents=opponents,
+                                            has_succeeded=has_succeeded)
+            if message is None:
+                return attack, None if attack is None else {}
+            send(self.writer, {"event": "error", "message": message})
+
+
+def act_in_worker(logic: LogicBase, arguments: dict[str, Any]):
+    # The logic is a copy in the worker, so it is sent back with its updated state.
+    return logic.act(**arguments), logic
+
+
+class PooledLogic(LogicBase):
+    # Run act of a CPU logic in an executor, so that a slow logic doesn't block other games
+    # on the event loop. The logic and its random streams go to a worker for each act.
+    # The global random states can't be sent, so games need a seed.
+    def __init__(self, logic: LogicBase, executor: Executor):
+        self.logic = logic
+        self.executor = executor
+        self.name = logic.name
+        # events of workers can't reach the game
+        self.logic.sink = NullSink()
+
+    def act(self, **arguments):
+        self.logic.rng, self.logic.np_rng = self.rng, self.np_rng
+        return self.logic.act(**arguments)
+
+    async def act_async(self, **arguments):
+        self.logic.rng, self.logic.np_rng = self.rng, self.np_rng
+        loop = asyncio.get_running_loop()
+        response, self.logic = await loop.run_in_executor(self.executor, act_in_worker, self.logic, arguments)
+        self.rng, self.np_rng = self.logic.rng, self.logic.np_rng
+        return response
+
+
+class GameServer:
+    # Host matches of humans against CPU logics on one event loop, a match per connection.
+    # The seat of the human goes round between matches, and the others are filled
+    # by cpu_factory, whose logics act in executor.
+    # Processes of executor should be started by forkserver or spawn:
+    # forked ones would keep the connections open after they are closed.
+    def __init__(self, cpu_factory: Callable[[], LogicBase], executor: Executor, players: int = 2,
+                 seed: Optional[int] = None, pacer: Optional[Pacer] = None, **game_options):
+        self.cpu_factory = cpu_factory
+        self.executor = executor
+        self.players = players
+        self.seed = seed
+        self.pacer = pacer
+        self.game_options = game_options
+        self.matches = 0
+        # human_player, winner and turns of each finished match. winner is None for a timeout.
+        self.results: list[dict[str, Any]] = []
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> asyncio.AbstractServer:
+        # port 0 picks a free port. See self.port.
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server
+
+    @property
+    def port(self) -> int:
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        index = self.matches
+        self.matches += 1
+        human_player = index % self.players
+        if self.seed is None:
+            seed = random.SystemRandom().randrange(2**32)
+        else:
+            seed = derive_seed(self.seed, 0, index)
+        logics = [RemoteHuman(reader=reader, writer=writer) if player_id == human_player
+                  else PooledLogic(logic=self.cpu_factory(), executor=self.executor)
+                  for player_id in range(self.players)]
+        game = Game(logics=logics, sink=StreamSink(writer), pacer=self.pacer,
+                    seed=seed, **self.game_options)
+        send(writer, {"event": "match", "player_id": human_player})
+        try:
+            outputs = await game.start_async()
+            self.results.append({"human_player": human_player,
+                                 "winner": None if outputs is None else outputs["winner"],
+                                 "turns": game.max_turns if outputs is None else outputs["turns"]})
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+
+async def play_client(host: str, port: int, choose: Callable[[dict[str, Any]], dict[str, Any]],
+                      show: Optional[Callable[[dict[str, Any]], None]] = None) -> list[dict[str, Any]]:
+    # Play a match by answering each act request with choose(request).
+    # show is called with every message. Returns all the messages from the server.
+    reader, writer = await asyncio.open_connection(host, port)
+    messages = []
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            messages.append(message)
+            if show is not None:
+                show(message)
+            if message["event"] == "act":
+                send(writer, choose(message))
+                await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return messages
@@ -0,0 +1,141 @@
+from bisect import bisect_left
+from typing import Optional, Tuple
+from tools.card import decode
+from tools.player import Player
+
+
+class UndoableHands:
+    # Mutable hands for lookahead.
+    # Cards are held in parallel lists. open() and insert() change them in place
+    # and undo() reverts the last change, so a search doesn't copy hands.
+    # It has the same read interface as Hands for the solver.
+    def __init__(self, codes: list[Optional[int]], opened: list[bool],
+                 card_ids: list[Optional[int]], colors: list[str], owned_by: Optional[int] = None):
+        # code of each card, None if it is unknown to the simulating player
+        self.codes = codes
+        self.opened = opened
+        self.card_ids = card_ids
+        self.colors = colors
+        self.owned_by = owned_by
+        # (operation, position, code before the operation)
+        self.journal: list[Tuple[str, int, Optional[int]]] = []
+
+    @classmethod
+    def from_hands(cls, hands, owned_by: int, referred_by: int) -> 'UndoableHands':
+        codes, opened, card_ids, colors = [], [], [], []
+        for card in hands.cards:
+            visible = card.opened or card.owned_by == referred_by
+            codes.append(card.get_code(referred_by=referred_by)
+                         if visible else None)
+            opened.append(card.opened)
+            card_ids.append(card.card_id)
+            colors.append(card.get_color())
+        return cls(codes=codes, opened=opened, card_ids=card_ids, colors=colors, owned_by=owned_by)
+
+    @classmethod
+    def from_codes(cls, codes: Tuple[int, ...], owned_by: int,
+                   card_ids: Optional[list[Optional[int]]] = None) -> 'UndoableHands':
+        # a hand candidate of the solver
+        card_ids = [None] * len(codes) if card_ids is None else list(card_ids)
+        return cls(codes=list(codes), opened=[False] * len(codes), card_ids=card_ids,
+                   colors=[decode(code)[0] for code in codes], owned_by=owned_by)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __repr__(self) -> str:
+        return " ".join([f"{color}??" if code is None or not opened else f"{color}{decode(code)[1]:02}"
+                         for code, opened, color in zip(self.codes, self.opened, self.colors)])
+
+    def open(self, position: int, code: Optional[int] = None) -> int:
+        # code is the number revealed by a hypothetical attack if it is unknown
+        if self.opened[position]:
+            raise Exception(f'The card is already opened: {position}')
+        previous = self.codes[position]
+        if code is None:
+            code = previous
+        if code is None:
+            raise Exception(f'The number of the card is unknown: {position}')
+        if previous is not None and previous != code:
+            raise Exception(f'The card at {position} is not {code}.')
+        self.codes[position] = code
+        self.opened[position] = True
+        self.journal.append(("open", position, previous))
+        return code
+
+    def insert(self, code: int, card_id: Optional[int] = None, opened: bool = False) -> int:
+        if None in self.codes:
+            raise Exception("Can't insert a card into hands with unknown cards.")
+        position = bisect_left(self.codes, code)
+        if position < len(self.codes) and self.codes[position] == code:
+            raise Exception(
+                f"Inserted card violates hands' uniqueness: {code}")
+        self.codes.insert(position, code)
+        self.opened.insert(position, opened)
+        self.card_ids.insert(position, card_id)
+        self.colors.insert(position, decode(code)[0])
+        self.journal.append(("insert", position, None))
+        return position
+
+    def undo(self) -> None:
+        operation, position, previous = self.journal.pop()
+        if operation == "open":
+            self.codes[position] = previous
+            self.opened[position] = False
+            return
+        del self.codes[position]
+        del self.opened[position]
+        del self.card_ids[position]
+        del self.colors[position]
+
+    def get_closed_cards(self) -> list[Tuple[int, int, str]]:
+        return [(position, card_id, color) for position, (opened, card_id, color)
+                in enumerate(zip(self.opened, self.card_ids, self.colors)) if not opened]
+
+    def get_opened_codes(self) -> list[Tuple[int, int]]:
+        return [(position, code) for position, (opened, code) in enumerate(zip(self.opened, self.codes)) if opened]
+
+    def get_codes(self, referred_by: int) -> list[int]:
+        if referred_by != self.owned_by and not all(self.opened):
+            raise Exception(
+                f'The numbers are not available because the cards are owned by Player{self.owned_by}, not Player{referred_by}.')
+        if None in self.codes:
+            raise Exception("The numbers of some cards are unknown.")
+        return list(self.codes)
+
+    def is_loser(self) -> bool:
+        return all(self.opened)
+
+
+class SimulationPlayer:
+    # A player in lookahead. Only what the simulating player knows is kept.
+    def __init__(self, player_id: int, hands: UndoableHands, name: Optional[str] = None):
+        self.player_id = player_id
+        self.hands = hands
+        self.name = name
+
+    @classmethod
+    def from_player(cls, player: Player, referred_by: int) -> 'SimulationPlayer':
+        return cls(player_id=player.player_id, name=player.name,
+                   hands=UndoableHands.from_hands(player.hands, owned_by=player.player_id, referred_by=referred_by))
+
+    def __repr__(self) -> str:
+        return f"{self.name}: {self.hands}"
+
+    def open(self, position: int, code: Optional[int] = None) -> int:
+        return self.hands.open(position=position, code=code)
+
+    def insert(self, code: int, card_id: Optional[int] = None) -> int:
+        return self.hands.insert(code=code, card_id=card_id)
+
+    def undo(self) -> None:
+        self.hands.undo()
+
+    def is_loser(self) -> bool:
+        return self.hands.is_loser()
+
+
+def as_simulation_player(player, referred_by: int) -> SimulationPlayer:
+    if isinstance(player, SimulationPlayer):
+        return player
+    return SimulationPlayer.from_player(player, referred_by=referred_by)
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Optional, Tuple
+from tools.attack import Attack
+from tools.card import CardContent
+from tools.consts import COLORS, NUMBERS, MAX_HANDS
+from tools.history import index_history
+from tools.player import Player
+
+# puts between checks of the size
+EVICTION_INTERVAL = 100
+
+
+class SolverCache:
+    # Counts of hand candidates of situations, persisted in a sqlite file.
+    # Worker processes open their own connections to the same file. WAL mode lets
+    # them read while another one writes, and results of a run are kept for the next.
+    # The least recently used entries are evicted above max_entries,
+    # which is checked every EVICTION_INTERVAL puts.
+    # Keys don't have the deck, so a file is only for the config it was made with.
+    def __init__(self, path: str, max_entries: int = 1000000, timeout: float = 30.0,
+                 config: Optional[dict[str, Any]] = None):
+        self.path = path
+        self.config = solver_config() if config is None else config
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.connection: Optional[sqlite3.Connection] = None
+        self.pid: Optional[int] = None
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __getstate__(self):
+        # connections can't be shared with other processes
+        state = self.__dict__.copy()
+        state["connection"] = None
+        state["pid"] = None
+        return state
+
+    def __deepcopy__(self, memo):
+        # shared by copies of logics like by workers
+        return self
+
+    def connect(self) -> sqlite3.Connection:
+        if self.connection is None or self.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS entries "
+                               "(key BLOB PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_used ON entries (used)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            config = json.dumps(self.config, sort_keys=True)
+            connection.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('config', ?)", (config,))
+            stored, = connection.execute(
+                "SELECT value FROM meta WHERE key = 'config'").fetchone()
+            if stored != config:
+                connection.close()
+                raise Exception(
+                    f"{self.path} is a solver cache of another config: {stored}, not {config}.")
+            self.connection = connection
+            self.pid = os.getpid()
+        return self.connection
+
+    def get(self, key: str) -> Optional[Tuple[int, list]]:
+        connection = self.connect()
+        digest = hash_key(key)
+        row = connection.execute(
+            "SELECT value FROM entries WHERE key = ?", (digest,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            connection.execute(
+                "UPDATE entries SET used = ? WHERE key = ?", (time.time(), digest))
+        except sqlite3.OperationalError:
+            # locked by other processes for too long. the order of eviction is not critical.
+            pass
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Tuple[int, list]) -> None:
+        connection = self.connect()
+        try:
+            connection.execute("INSERT OR REPLACE INTO entries (key, value, used) VALUES (?, ?, ?)",
+                               (hash_key(key), json.dumps(value, separators=(",", ":")), time.time()))
+        except sqlite3.OperationalError:
+            # locked by other processes for too long. it will be computed again.
+            return
+        self.puts += 1
+        if self.puts % EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        connection = self.connect()
+        size = self.size()
+        if size <= self.max_entries:
+            return
+        connection.execute("DELETE FROM entries WHERE key IN "
+                           "(SELECT key FROM entries ORDER BY used LIMIT ?)", (size - self.max_entries,))
+        self.evictions += size - self.max_entries
+
+    def size(self) -> int:
+        return self.connect().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self) -> None:
+        if self.connection is not None and self.pid == os.getpid():
+            self.connection.close()
+        self.connection = None
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": self.size()}
+
+
+def solver_config() -> dict[str, Any]:
+    # what the counts depend on besides situations
+    return {"colors": COLORS, "numbers": NUMBERS, "max_hands": MAX_HANDS}
+
+
+def hash_key(key: str) -> bytes:
+    return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+
+def situation_key(player: Player, opened_cards: list[CardContent], new_card: Optional[CardContent],
+                  opponents: list[Player], history: list[Attack]) -> str:
+    # Canonical encoding of what count_hand_candidates depends on: visible codes,
+    # and each card of opponents as its code if opened, or its color and tried codes.
+    # Player ids and card ids are left out, so the same situation in other games,
+    # or for other players, has the same key.
+    visible = {card.to_code() for card in opened_cards}
+    visible.update(player.hands.get_codes(referred_by=player.player_id))
+    if new_card is not None:
+        visible.add(new_card.to_code())
+    history_index = index_history(history)
+    hands = [[card.get_code() if card.opened else
+              [card.get_color(), sorted(history_index.tried_cards(card.card_id))]
+              for card in opponent.hands.cards]
+             for opponent in opponents]
+    return json.dumps([sorted(visible), hands], separators=(",", ":"))
+
+
+def encode_counter(candidates_num: int, counter: dict[Tuple[int, int], dict[int, int]],
+                   opponents: list[Player]) -> Tuple[int, list]:
+    # counts of the closed cards with the indexes of opponents instead of their ids
+    return candidates_num, [[index, position, sorted(counter[(opponent.player_id, position)].items())]
+                            for index, opponent in enumerate(opponents)
+                            for position, _, _ in opponent.hands.get_closed_cards()]
+
+
+def decode_counter(value: Tuple[int, list], opponents: list[Player]) -> Tuple[int, dict[Tuple[int, int], dict[int, int]]]:
+    candidates_num, entries = value
+    return candidates_num, {(opponents[index].player_id, position): {code: count for code, count in counts}
+                            for index, position, counts in entries}
@@ -0,0 +1,182 @@
+import copy
+import itertools
+import math
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Tuple
+import numpy as np
+from tools.events import NullSink
+from tools.game import Game
+from tools.logic import LogicBase
+from tools.results import ResultLog
+
+# bins of predicted probabilities of attacks
+CALIBRATION_BINS = 10
+
+
+def derive_seed(seed: int, matchup_index: int, game_index: int) -> int:
+    # Each game has its own seed, so results don't depend on how games are
+    # distributed to workers.
+    return int(np.random.SeedSequence([seed, matchup_index, game_index]).generate_state(1)[0])
+
+
+def play_game(task: Tuple[Tuple[str, int], list[LogicBase], int, dict[str, Any]]) -> dict[str, Any]:
+    (name, game_index), logics, game_seed, game_options = task
+    # Each game has its own copy of the logics, whether it is played in this process
+    # or in a worker, where tasks of a chunk share them.
+    logics = copy.deepcopy(logics)
+    game = Game(logics=logics, seed=game_seed, **game_options)
+    game.start()
+    # outputs of a game without a winner within max_turns too
+    outputs = game.outputs
+    record = {"matchup": name, "game": game_index, "seed": game_seed}
+    return {**record, **{key: outputs[key] for key in
+                         ["winner", "turns", "skip_count", "attack_results", "proba_list"]}}
+
+
+def wilson_interval(successes: int, trials: int, z: float = 1.96) -> Tuple[float, float]:
+    if trials == 0:
+        return 0.0, 1.0
+    p = successes / trials
+    denominator = 1 + z**2 / trials
+    center = (p + z**2 / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials +
+                           z**2 / (4 * trials**2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+class MatchResult:
+    # Running aggregates of games of a matchup. Memory doesn't grow with games.
+    def __init__(self, name: str, players: int):
+        self.name = name
+        self.wins = [0] * players
+        self.draws = 0
+        self.turn_histogram: Counter[int] = Counter()
+        self.skips = [0] * players
+        # attacks by bins of predicted probabilities
+        self.attacks = [0] * CALIBRATION_BINS
+        self.proba_sums = [0.0] * CALIBRATION_BINS
+        self.successes = [0] * CALIBRATION_BINS
+
+    def add(self, winner: Optional[int], turns: Optional[int], skip_count: Optional[list[int]] = None,
+            attack_results: Optional[list[bool]] = None, proba_list: Optional[list[Optional[float]]] = None) -> None:
+        if skip_count is not None:
+            for player_id, count in enumerate(skip_count):
+                self.skips[player_id] += count
+        if attack_results is not None and proba_list is not None:
+            for result, proba in zip(attack_results, proba_list):
+                if proba is None:
+                    continue
+                index = min(int(proba * CALIBRATION_BINS), CALIBRATION_BINS - 1)
+                self.attacks[index] += 1
+                self.proba_sums[index] += proba
+                self.successes[index] += int(result)
+        if winner is None:
+            self.draws += 1
+            return
+        self.wins[winner] += 1
+        self.turn_histogram[turns] += 1
+
+    def add_record(self, record: dict[str, Any]) -> None:
+        self.add(winner=record["winner"], turns=record["turns"], skip_count=record.get("skip_count"),
+                 attack_results=record.get("attack_results"), proba_list=record.get("proba_list"))
+
+    def games(self) -> int:
+        return sum(self.wins) + self.draws
+
+    def mean_turns(self) -> Optional[float]:
+        finished = sum(self.turn_histogram.values())
+        if finished == 0:
+            return None
+        return sum(turns * count for turns, count in self.turn_histogram.items()) / finished
+
+    def calibration(self) -> list[dict[str, Any]]:
+        # mean predicted probability and success rate of attacks in each bin
+        return [{"bin": [index / CALIBRATION_BINS, (index + 1) / CALIBRATION_BINS], "attacks": attacks,
+                 "mean_proba": self.proba_sums[index] / attacks, "success_rate": self.successes[index] / attacks}
+                for index, attacks in enumerate(self.attacks) if attacks > 0]
+
+    def win_rate(self, player_id: int = 0) -> float:
+        games = self.games()
+        if games == 0:
+            return 0.0
+        return self.wins[player_id] / games
+
+    def confidence_interval(self, player_id: int = 0, z: float = 1.96) -> Tuple[float, float]:
+        return wilson_interval(self.wins[player_id], self.games(), z=z)
+
+    def __repr__(self) -> str:
+        lower, upper = self.confidence_interval()
+        return f"{self.name}: {self.win_rate():.3f} [{lower:.3f}, {upper:.3f}] ({self.games()} games)"
+
+
+class Tournament:
+    # With output, a record of each game is appended to the file as soon as it is
+    # collected, and a run with the same file resumes after the recorded games.
+    # Recorded games must have the seeds of this run, and games beyond trials are left out.
+    def __init__(self, matchups: dict[str, list[LogicBase]], trials: int,
+                 workers: Optional[int] = None, seed: int = 0,
+                 game_options: Optional[dict[str, Any]] = None,
+                 output: Optional[str] = None, window: int = 1024):
+        self.matchups = matchups
+        self.trials = trials
+        self.workers = workers
+        self.seed = seed
+        # headless by default
+        self.game_options = {"sink": NullSink()}
+        if game_options is not None:
+            self.game_options.update(game_options)
+        self.output = output
+        # games submitted to workers at once
+        self.window = window
+
+    def tasks(self, done: Optional[dict[str, int]] = None):
+        # Games are collected in this order, so recorded games of a matchup are its first ones.
+        for i, (name, logics) in enumerate(self.matchups.items()):
+            start = 0 if done is None else done.get(name, 0)
+            for j in range(start, self.trials):
+                yield (name, j), logics, derive_seed(self.seed, i, j), self.game_options
+
+    def run(self) -> dict[str, MatchResult]:
+        results = {name: MatchResult(name=name, players=len(logics))
+                   for name, logics in self.matchups.items()}
+        log = None if self.output is None else ResultLog(self.output)
+        done: Counter[str] = Counter()
+        if log is not None:
+            log.repair()
+            indexes = {name: i for i, name in enumerate(self.matchups)}
+            for record in log.read():
+                name = record["matchup"]
+                if name not in results or record["game"] >= self.trials:
+                    continue
+                if record["seed"] != derive_seed(self.seed, indexes[name], record["game"]):
+                    raise Exception(
+                        f"{self.output} has games of another seed or order of matchups. Use another file.")
+                results[name].add_record(record)
+                done[name] += 1
+        try:
+            if self.workers == 1:
+                return self.collect(results, map(play_game, self.tasks(done)), log)
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                return self.collect(results, self.map(executor, self.tasks(done)), log)
+        finally:
+            if log is not None:
+                log.close()
+
+    def map(self, executor: ProcessPoolExecutor, tasks):
+        # executor.map submits all tasks at once, so they are given window by window.
+        tasks = iter(tasks)
+        while True:
+            window = list(itertools.islice(tasks, self.window))
+            if len(window) == 0:
+                return
+            workers = self.workers or os.cpu_count() or 1
+            yield from executor.map(play_game, window, chunksize=max(1, len(window) // (4 * workers)))
+
+    def collect(self, results, records, log: Optional[ResultLog] = None) -> dict[str, MatchResult]:
+        for record in records:
+            results[record["matchup"]].add_record(record)
+            if log is not None:
+                log.write(record)
+        return results
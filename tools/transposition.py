@@ -0,0 +1,46 @@
+import hashlib
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+import numpy as np
+
+
+class TranspositionTable:
+    # Bounded cache of search results with LRU eviction.
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self.entries: OrderedDict[Hashable, Any] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def reset(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "size": len(self.entries)}
+
+
+def fingerprint(matrix: np.ndarray) -> Hashable:
+    # Filtering keeps the order of rows, so the same candidate set has the same bytes.
+    # A digest of the bytes keeps keys small however many rows the matrix has.
+    return matrix.shape, hashlib.blake2b(np.ascontiguousarray(matrix).tobytes(), digest_size=16).digest()